@@ -0,0 +1,148 @@
+"""
+Semantic answer cache for /chat
+
+Lookups first try an exact match on the normalized question, then fall back
+to the closest cached question by cosine similarity of the (already
+normalized) MiniLM query embeddings. Entries expire after a TTL, the cache
+is LRU-bounded, and everything is dropped when the index version changes.
+"""
+
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and strip trailing punctuation"""
+    question = _WHITESPACE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", question)
+
+
+class _Entry:
+    __slots__ = ("embedding", "value", "expires_at")
+
+    def __init__(self, embedding, value, expires_at: float):
+        self.embedding = embedding
+        self.value = value
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """LRU + TTL cache of chat answers with near-duplicate matching"""
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.index_version = None
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def check_version(self, index_version) -> None:
+        """Drop all entries if the underlying index has changed"""
+        if index_version != self.index_version:
+            if self._entries:
+                self.invalidations += 1
+            self.clear()
+            self.index_version = index_version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_keys = []
+
+    def get_exact(self, key: str):
+        """Return the cached value for a normalized question, or None"""
+        value = self._live(key)
+        if value is not None:
+            self.exact_hits += 1
+        return value
+
+    def get_similar(self, embedding: List[float]):
+        """Return the value of the closest cached question above the threshold"""
+        if not self._entries:
+            self.misses += 1
+            return None
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.array([self._entries[k].embedding for k in self._matrix_keys],
+                                    dtype=np.float32)
+
+        # Embeddings are L2-normalized, so the dot product is the cosine similarity
+        scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+        best = int(np.argmax(scores))
+        key = self._matrix_keys[best]
+        if scores[best] >= self.threshold:
+            value = self._live(key)
+            if value is not None:
+                self.semantic_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: List[float], value) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(list(embedding), value, time.monotonic() + self.ttl)
+        self._matrix = None
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _live(self, key: str):
+        """Return an unexpired value and mark it recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def index_version(persist_directory: str) -> Optional[float]:
+    """Cheap change marker for the Chroma collection (sqlite file mtime)"""
+    try:
+        return os.stat(os.path.join(persist_directory, "chroma.sqlite3")).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,183 @@
+"""
+Batch benchmark: sequential /chat calls vs one /chat/batch request
+
+Builds a fixture index from SAMPLE_DOCS, starts uvicorn with the stub LLM
+and the answer and embedding caches off, then answers the same N questions
+three ways: a sequential loop of /chat calls (what the study-guide and
+evaluation jobs do today), one ordered /chat/batch request, and one
+streamed (NDJSON) /chat/batch request. Reports questions per second, the
+time to the first streamed answer, and how often the batch path cited the
+same sources as /chat (the matrix search is exact, Chroma's HNSW is not).
+
+Then restarts the server under a time-scaled LLM quota (--quota-rpm with a
+1s burst and a 3s queue timeout by default) and checks that a batch much
+larger than the burst size still completes with no errors; exits non-zero
+if any question failed.
+
+Usage:
+    python benchmarks/batch_bench.py --questions 100 --llm-latency-ms 300
+    python benchmarks/batch_bench.py --quota-rpm 150 --quota-questions 40
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e_bench import CHAT_QUESTIONS  # noqa: E402
+from startup_bench import BACKEND_DIR, wait_for  # noqa: E402
+
+
+def server_environment(workdir: str, args, **overrides) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBED_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        "QUIZ_BANK_ENABLED": "false",
+        "SESSION_BACKEND": "off",
+        "LLM_PROVIDER": "stub",
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "STUB_LLM_TOKENS_PER_SEC": "0",
+        "CHAT_BATCH_CONCURRENCY": str(args.batch_concurrency),
+    })
+    env.update(overrides)
+    return env
+
+
+def start_server(env: dict, port: int, timeout: float) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/ready", time.time() + timeout)
+    return server
+
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def quota_check(workdir: str, args, questions: list) -> int:
+    """Errors in one batch much larger than the LLM burst size, under a time-scaled quota"""
+    env = server_environment(workdir, args, LLM_RPM=str(args.quota_rpm),
+                             LLM_BURST_SECONDS=str(args.quota_burst_seconds),
+                             LLM_QUEUE_TIMEOUT=str(args.quota_queue_timeout))
+    burst = args.quota_rpm * args.quota_burst_seconds / 60
+    server = start_server(env, args.port, args.timeout)
+    try:
+        results, seconds = batch(f"http://127.0.0.1:{args.port}", questions)
+    finally:
+        stop_server(server)
+    errors = [item["error"] for item in results if item.get("error")]
+    print(f"  quota {args.quota_rpm:g} RPM (burst {burst:g}, queue timeout {args.quota_queue_timeout:g}s): "
+          f"{len(questions)} questions in {seconds:.2f}s, {len(errors)} errors"
+          + (f" (first: {errors[0]})" if errors else ""))
+    return len(errors)
+
+
+def sequential(base_url: str, questions: list) -> tuple:
+    session = requests.Session()
+    start = time.perf_counter()
+    results = []
+    for question in questions:
+        response = session.post(base_url + "/chat", json={"question": question}, timeout=120)
+        response.raise_for_status()
+        results.append(response.json())
+    return results, time.perf_counter() - start
+
+
+def batch(base_url: str, questions: list) -> tuple:
+    start = time.perf_counter()
+    response = requests.post(base_url + "/chat/batch", json={"questions": questions}, timeout=600)
+    response.raise_for_status()
+    return response.json()["results"], time.perf_counter() - start
+
+
+def batch_stream(base_url: str, questions: list) -> tuple:
+    start = time.perf_counter()
+    first = None
+    items = []
+    with requests.post(base_url + "/chat/batch", json={"questions": questions, "stream": True},
+                       stream=True, timeout=600) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+            items.append(json.loads(line))
+    return items, time.perf_counter() - start, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--batch-concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--quota-rpm", type=float, default=150, help="LLM_RPM for the quota check (0 skips it)")
+    parser.add_argument("--quota-questions", type=int, default=40)
+    parser.add_argument("--quota-burst-seconds", type=float, default=1)
+    parser.add_argument("--quota-queue-timeout", type=float, default=3)
+    args = parser.parse_args()
+
+    questions = [f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} (#{i})" for i in range(args.questions)]
+    workdir = tempfile.mkdtemp(prefix="batch_bench_")
+    server = None
+    failed = 0
+    try:
+        env = server_environment(workdir, args)
+        print("📚 Building fixture index from SAMPLE_DOCS...")
+        subprocess.run(
+            [sys.executable, "-c", "import ingest_docs; ingest_docs.ingest_documents(use_sample_data=True)"],
+            cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(env, args.port, args.timeout)
+        batch(base_url, questions[:2])  # loads the matrix
+
+        print(f"🏃 {args.questions} questions, stub LLM {args.llm_latency_ms:g}ms, "
+              f"batch concurrency {args.batch_concurrency}:")
+        chat_results, chat_seconds = sequential(base_url, questions)
+        print(f"  sequential /chat:   {chat_seconds:7.2f}s  {args.questions / chat_seconds:7.1f} q/s")
+        batch_results, batch_seconds = batch(base_url, questions)
+        print(f"  /chat/batch:        {batch_seconds:7.2f}s  {args.questions / batch_seconds:7.1f} q/s  "
+              f"({chat_seconds / batch_seconds:.1f}x)")
+        stream_results, stream_seconds, first = batch_stream(base_url, questions)
+        print(f"  /chat/batch NDJSON: {stream_seconds:7.2f}s  {args.questions / stream_seconds:7.1f} q/s  "
+              f"first answer after {first:.2f}s")
+
+        errors = sum(1 for item in batch_results + stream_results if item.get("error"))
+        same = sum(1 for chat, item in zip(chat_results, batch_results) if chat["sources"] == item["sources"])
+        print(f"  same sources as /chat: {same}/{args.questions}  batch errors: {errors}")
+        stop_server(server)
+        server = None
+
+        if args.quota_rpm:
+            quota_questions = [f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} (quota #{i})"
+                               for i in range(args.quota_questions)]
+            failed = quota_check(workdir, args, quota_questions)
+    finally:
+        if server is not None:
+            stop_server(server)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
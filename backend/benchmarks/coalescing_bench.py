@@ -0,0 +1,141 @@
+"""
+Coalescing check for /chat and /chat/stream with a stubbed slow LLM
+
+Fires N concurrent requests with the same question (varied only in case,
+spacing and trailing punctuation) at the in-process app, with the answer
+cache disabled so only single-flight coalescing can save work, and counts
+how many generations the LLM actually ran. Does the same for streaming
+subscribers, then for a mix of distinct questions and retrieval settings,
+which must not be merged. Exits non-zero if any count is off.
+
+Usage:
+    python benchmarks/coalescing_bench.py --requests 50 --llm-latency-ms 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+import executors  # noqa: E402
+from llm import StubProvider  # noqa: E402
+from concurrency_bench import StubEmbeddings, StubVectorStore  # noqa: E402
+
+
+class CountingProvider(StubProvider):
+    """Stub LLM that counts the generations it was asked for"""
+
+    def __init__(self, latency_ms: float):
+        super().__init__(latency_ms=latency_ms, tokens_per_sec=200, output_tokens=40)
+        self.generations = 0
+
+    async def agenerate(self, prompt: str) -> str:
+        self.generations += 1
+        return await super().agenerate(prompt)
+
+    async def astream(self, prompt: str):
+        self.generations += 1
+        async for token in super().astream(prompt):
+            yield token
+
+
+def variant(question: str, i: int) -> str:
+    """Same question after normalization: different case, spacing and punctuation"""
+    return [question, question.upper(), f"  {question}  ", question.rstrip("?") + "!?"][i % 4]
+
+
+async def _consume_stream(request: main.ChatRequest) -> str:
+    answer = []
+    async for frame in main._chat_event_stream(request, request.conversation_history):
+        event, data = frame.split("\n", 1)
+        if event == "event: token":
+            answer.append(data)
+        elif event == "event: error":
+            raise RuntimeError(data)
+    return "".join(answer)
+
+
+async def _timed(requests, send) -> tuple:
+    start = time.perf_counter()
+    answers = await asyncio.gather(*[send(request) for request in requests])
+    return answers, time.perf_counter() - start
+
+
+def check(label: str, generations: int, expected: int, answers: list, elapsed: float,
+          same_answer: bool = True) -> bool:
+    ok = generations == expected and (not same_answer or len(set(answers)) == 1)
+    print(f"{'✅' if ok else '❌'} {label:<38} {len(answers):>4} requests -> {generations} generation(s) "
+          f"(expected {expected}) in {elapsed:.2f}s")
+    return ok
+
+
+async def _run(num_requests: int, llm_latency_ms: float) -> bool:
+    question = "What is Amazon SageMaker?"
+    ok = True
+
+    main.llm = CountingProvider(llm_latency_ms)
+    requests = [main.ChatRequest(question=variant(question, i)) for i in range(num_requests)]
+    answers, elapsed = await _timed(requests, lambda request: main.chat(request))
+    ok &= check("/chat, identical questions", main.llm.generations, 1,
+                [answer.answer for answer in answers], elapsed)
+
+    main.llm = CountingProvider(llm_latency_ms)
+    answers, elapsed = await _timed(requests, _consume_stream)
+    ok &= check("/chat/stream, identical questions", main.llm.generations, 1, answers, elapsed)
+
+    # Late subscribers join mid-stream and must still receive every token
+    main.llm = CountingProvider(llm_latency_ms)
+
+    async def late(request, delay):
+        await asyncio.sleep(delay)
+        return await _consume_stream(request)
+
+    answers, elapsed = await _timed(
+        [(request, i * llm_latency_ms / 1000 / num_requests) for i, request in enumerate(requests)],
+        lambda args: late(*args)
+    )
+    ok &= check("/chat/stream, staggered subscribers", main.llm.generations, 1, answers, elapsed)
+
+    # Different questions or retrieval settings must each get their own generation
+    main.llm = CountingProvider(llm_latency_ms)
+    distinct = [
+        main.ChatRequest(question=question),
+        main.ChatRequest(question="What is Amazon Bedrock?"),
+        main.ChatRequest(question=question, sparse_weight=0.0),
+        main.ChatRequest(question=question, rerank=False),
+    ]
+    mixed = [distinct[i % len(distinct)] for i in range(num_requests)]
+    answers, elapsed = await _timed(mixed, lambda request: main.chat(request))
+    # rerank=False retrieves like the default when no reranker is loaded, so it shares that flight
+    ok &= check("/chat, mixed questions and settings", main.llm.generations, len(distinct) - 1,
+                [answer.answer for answer in answers], elapsed, same_answer=False)
+
+    stats = main.chat_flights.stats()
+    print(f"   coalesced {stats['coalesced']} of {stats['coalesced'] + stats['leaders']} requests, "
+          f"{int(main.LLM_CALLS_SAVED.total())} LLM calls saved")
+    return ok
+
+
+def run_benchmark(num_requests: int, llm_latency_ms: float) -> bool:
+    main.embeddings = StubEmbeddings()
+    main.vector_store = StubVectorStore()
+    main.sparse_index = None
+    main.reranker = None
+    main.ANSWER_CACHE_ENABLED = False
+    try:
+        return asyncio.run(_run(num_requests, llm_latency_ms))
+    finally:
+        executors.shutdown_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.requests, args.llm_latency_ms) else 1)
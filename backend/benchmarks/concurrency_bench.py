@@ -0,0 +1,100 @@
+"""
+Concurrency benchmark for /chat with a stubbed slow LLM
+
+Runs N concurrent chat requests against the in-process app twice:
+once with every stage called inline on the event loop (the old behaviour)
+and once through the bounded stage executors.
+
+Usage:
+    python benchmarks/concurrency_bench.py --requests 50 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+import executors  # noqa: E402
+from llm import LLMProvider  # noqa: E402
+
+
+class StubDocument:
+    def __init__(self, text: str, source: str):
+        self.page_content = text
+        self.metadata = {"source": source}
+
+
+class StubEmbeddings:
+    def embed_query(self, text: str):
+        return [0.0] * 384
+
+
+class StubVectorStore:
+    def similarity_search_by_vector(self, embedding, k: int = 3):
+        return [StubDocument(f"chunk {i}", f"https://example.com/{i}") for i in range(k)]
+
+
+class SlowProvider(LLMProvider):
+    """Blocks the calling thread like a real Gemini round trip"""
+
+    name = "slow-stub"
+
+    def __init__(self, latency: float, inline: bool):
+        self.latency = latency
+        self.inline = inline
+        self.model_name = f"slow-stub-{latency}s"
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return "stub answer"
+
+    async def agenerate(self, prompt: str) -> str:
+        if self.inline:
+            # The old behaviour: a blocking call straight on the event loop
+            return self.generate(prompt)
+        return await super().agenerate(prompt)
+
+
+async def _inline_stage(stage, func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def _run(num_requests: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        main.chat(main.ChatRequest(question=f"What is SageMaker? #{i}"))
+        for i in range(num_requests)
+    ])
+    return time.perf_counter() - start
+
+
+def run_benchmark(num_requests: int, llm_latency: float):
+    main.embeddings = StubEmbeddings()
+    main.vector_store = StubVectorStore()
+    main.ANSWER_CACHE_ENABLED = False
+
+    results = {}
+    for label, stage_runner, inline in (("inline", _inline_stage, True),
+                                        ("executors", executors.run_in_stage, False)):
+        main.run_in_stage = stage_runner
+        main.llm = SlowProvider(llm_latency, inline)
+        elapsed = asyncio.run(_run(num_requests))
+        results[label] = elapsed
+        print(f"{label:>10}: {num_requests} requests in {elapsed:.2f}s "
+              f"({num_requests / elapsed:.1f} req/s)")
+
+    executors.shutdown_pools()
+    print(f"   speedup: {results['inline'] / results['executors']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    run_benchmark(args.requests, args.llm_latency)
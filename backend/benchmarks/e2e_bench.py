@@ -0,0 +1,276 @@
+"""
+End-to-end benchmark of the RAG request path
+
+Builds a fixture Chroma collection from SAMPLE_DOCS in a temporary
+directory, starts the FastAPI app in-process with the stub LLM provider,
+and replays a mix of /chat and /quiz requests at each concurrency level.
+Reports p50/p95/p99 latency, throughput and peak RSS per level, plus
+microbenchmarks of query embedding, similarity_search, prompt assembly and
+quiz JSON parsing. Results are written as JSON so runs can be compared.
+
+Requires httpx (pip install httpx) in addition to the backend requirements.
+
+Usage:
+    python benchmarks/e2e_bench.py --concurrency 1 8 32 --requests 200
+    python benchmarks/e2e_bench.py --output results/before.json
+    python benchmarks/e2e_bench.py --compare results/before.json results/after.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+CHAT_QUESTIONS = [
+    "What is Amazon SageMaker?",
+    "Textract vs Rekognition for extracting text?",
+    "What foundation models are available in Amazon Bedrock?",
+    "How does Amazon Comprehend detect PII?",
+    "What are the domains of the MLS-C01 exam?",
+    "How do I build a chatbot with Amazon Lex?",
+    "What data does Amazon Personalize need?",
+    "Which SageMaker deployment option suits spiky traffic?",
+    "How does SageMaker Model Monitor detect drift?",
+    "When should I use Amazon A2I with Textract?",
+]
+
+QUIZ_TOPICS = ["Amazon SageMaker", "Amazon Bedrock", "Amazon Comprehend", "Amazon Rekognition"]
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies_ms) -> dict:
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_environment(workdir: str, args):
+    """Point the backend at a throwaway index and the stub LLM before importing it"""
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(workdir, "chroma_db")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["STUB_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["STUB_LLM_TOKENS_PER_SEC"] = str(args.llm_tokens_per_sec)
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+
+async def replay(client, num_requests: int, concurrency: int, chat_ratio: float, seed: int) -> dict:
+    """Send num_requests requests from `concurrency` workers; returns latency stats"""
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(num_requests):
+        if rng.random() < chat_ratio:
+            plan.append(("chat", "/chat", {"question": rng.choice(CHAT_QUESTIONS)}))
+        else:
+            plan.append(("quiz", "/quiz", {"topic": rng.choice(QUIZ_TOPICS), "num_questions": 5}))
+
+    queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+    latencies = {"chat": [], "quiz": []}
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                kind, path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.post(path, json=body)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code == 200:
+                latencies[kind].append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+
+    all_latencies = latencies["chat"] + latencies["quiz"]
+    return {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(all_latencies) / wall, 2) if wall > 0 else 0.0,
+        "overall": summarize(all_latencies),
+        "chat": summarize(latencies["chat"]),
+        "quiz": summarize(latencies["quiz"]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def time_call(func, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def run_microbenchmarks(main, iterations: int) -> dict:
+    # Bypass the embedding cache so the model itself is measured
+    raw_embeddings = getattr(main.embeddings, "embeddings", main.embeddings)
+    questions = iter(f"{q} #{i}" for i in range(iterations * 2) for q in CHAT_QUESTIONS)
+    vector = raw_embeddings.embed_query(CHAT_QUESTIONS[0])
+    docs = main.vector_store.similarity_search_by_vector(vector, k=3)
+    quiz_text = main.llm.generate(main.build_quiz_prompt("Amazon SageMaker", "medium", 5))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "embed_query": time_call(lambda: raw_embeddings.embed_query(next(questions)), iterations),
+            "similarity_search": time_call(
+                lambda: main.vector_store.similarity_search_by_vector(vector, k=3), iterations),
+            "prompt_assembly": time_call(
+                lambda: main.build_chat_prompt(CHAT_QUESTIONS[0], docs), iterations),
+            "quiz_json_parse": time_call(
+                lambda: main.parse_quiz_questions(quiz_text, "Amazon SageMaker"), iterations),
+        }
+
+
+async def run_load(main, args) -> list:
+    import httpx
+
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for concurrency in args.concurrency:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await replay(client, args.requests, concurrency, args.chat_ratio, args.seed)
+            results.append(result)
+            print(f"  c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {result['overall']['p50_ms']:>8.1f}ms  p95 {result['overall']['p95_ms']:>8.1f}ms  "
+                  f"p99 {result['overall']['p99_ms']:>8.1f}ms  errors {result['errors']}  "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+    return results
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Print per-level latency/throughput deltas between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def change(old, new):
+        return f"{new:>9.1f} ({(new - old) / old * 100:+.1f}%)" if old else f"{new:>9.1f}"
+
+    print(f"baseline {baseline['meta']['git_revision']} -> candidate {candidate['meta']['git_revision']}")
+    levels = {r["concurrency"]: r for r in baseline["load"]}
+    for result in candidate["load"]:
+        old = levels.get(result["concurrency"])
+        if old is None:
+            continue
+        print(f"  c={result['concurrency']:<4} "
+              f"req/s {change(old['throughput_rps'], result['throughput_rps'])}  "
+              f"p50 {change(old['overall']['p50_ms'], result['overall']['p50_ms'])}  "
+              f"p99 {change(old['overall']['p99_ms'], result['overall']['p99_ms'])}")
+    for name, stats in candidate["micro"].items():
+        old = baseline["micro"].get(name)
+        if old:
+            print(f"  {name:<18} p50 {change(old['p50_ms'], stats['p50_ms'])}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--chat-ratio", type=float, default=0.8, help="share of /chat in the mix")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=200)
+    parser.add_argument("--micro-iterations", type=int, default=200)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="e2e_bench_")
+    try:
+        prepare_environment(workdir, args)
+        import ingest_docs
+        import main
+
+        print("📚 Building fixture index from SAMPLE_DOCS...")
+        with contextlib.redirect_stdout(io.StringIO()):
+            ingest_docs.ingest_documents(use_sample_data=True)
+            main.initialize_rag()
+
+        print("🏃 Load test:")
+        load = asyncio.run(run_load(main, args))
+
+        print("🔬 Microbenchmarks:")
+        micro = run_microbenchmarks(main, args.micro_iterations)
+        for name, stats in micro.items():
+            print(f"  {name:<18} p50 {stats['p50_ms']:>8.3f}ms  p99 {stats['p99_ms']:>8.3f}ms")
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "git_revision": git_revision(),
+                "config": vars(args),
+            },
+            "load": load,
+            "micro": micro,
+        }
+        output = args.output or os.path.join(
+            BACKEND_DIR, "benchmarks", "results",
+            f"e2e-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 Results written to {output}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_cli()
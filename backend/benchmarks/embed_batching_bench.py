@@ -0,0 +1,72 @@
+"""
+Query embedding micro-batching benchmark: throughput and p99 per concurrency
+
+Loads the MiniLM model (no embedding cache) and, at each concurrency level,
+runs closed-loop clients that each embed their next question as soon as the
+previous one returns. Compares embedding every query on its own on the
+embed pool (the old path) with the EmbeddingBatcher at the given window
+and max batch size.
+
+Usage:
+    python benchmarks/embed_batching_bench.py --concurrency 1 4 16 64 --requests 512
+    python benchmarks/embed_batching_bench.py --window-ms 5 --max-batch 64
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import executors  # noqa: E402
+from e2e_bench import CHAT_QUESTIONS, summarize  # noqa: E402
+from embed_batcher import EmbeddingBatcher  # noqa: E402
+from embedding import load_embeddings  # noqa: E402
+
+
+async def _level(embed, concurrency: int, num_requests: int) -> dict:
+    latencies = []
+    counter = iter(range(num_requests))
+
+    async def client():
+        for i in counter:
+            question = f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} #{i}"
+            start = time.perf_counter()
+            await embed(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+    return {"throughput": num_requests / wall, **summarize(latencies)}
+
+
+def run_benchmark(args):
+    model = load_embeddings()
+    model.embed_query("warm up")
+
+    async def direct(question):
+        return await executors.run_in_stage("embed", model.embed_query, question)
+
+    print(f"{'concurrency':>11}  {'mode':>8}  {'q/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  mean batch")
+    for concurrency in args.concurrency:
+        for mode in ("direct", "batched"):
+            batcher = EmbeddingBatcher(model, window_ms=args.window_ms, max_batch=args.max_batch)
+            embed = direct if mode == "direct" else batcher.embed_query
+            result = asyncio.run(_level(embed, concurrency, args.requests))
+            mean_batch = batcher.stats()["mean_batch_size"] if mode == "batched" else 1.0
+            print(f"{concurrency:>11}  {mode:>8}  {result['throughput']:>8.1f}  {result['p50_ms']:>8.2f}  "
+                  f"{result['p99_ms']:>8.2f}  {mean_batch:>10.1f}")
+    executors.shutdown_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=512, help="embeddings per concurrency level")
+    parser.add_argument("--window-ms", type=float, default=3)
+    parser.add_argument("--max-batch", type=int, default=32)
+    run_benchmark(parser.parse_args())
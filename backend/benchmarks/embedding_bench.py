@@ -0,0 +1,76 @@
+"""
+Embedding throughput benchmark for the ingest pipeline
+
+Embeds the SAMPLE_DOCS chunks and a synthetic corpus through
+EmbeddingPipeline, writing into a throwaway Chroma collection, and reports
+chunks/sec and peak RSS. Run with different --batch-size / --processes
+values to compare settings.
+
+Usage:
+    python benchmarks/embedding_bench.py --synthetic 100000 --processes 4
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import chromadb  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+
+from embedding import EmbeddingPipeline, index_documents, load_embeddings  # noqa: E402
+from ingest_docs import SAMPLE_DOCS, create_sample_documents  # noqa: E402
+
+
+def sample_chunks():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+    splits = splitter.split_documents(create_sample_documents())
+    return [(f"sample-{i}", doc) for i, doc in enumerate(splits)]
+
+
+def synthetic_chunks(count: int, seed: int = 0):
+    """Lazily generate chunks of 100-1000 chars from the sample vocabulary"""
+    rng = random.Random(seed)
+    words = " ".join(doc["content"] for doc in SAMPLE_DOCS).split()
+    for i in range(count):
+        length = rng.randint(15, 150)
+        text = " ".join(rng.choice(words) for _ in range(length))
+        yield f"synthetic-{i}", Document(page_content=text, metadata={"source": f"synthetic://{i % 500}"})
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(label: str, items, pipeline: EmbeddingPipeline, write_batch_size: int):
+    directory = tempfile.mkdtemp(prefix="embed_bench_")
+    try:
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.get_or_create_collection("bench")
+        result = index_documents(collection, pipeline, items, write_batch_size=write_batch_size)
+        print(f"{label:>10}: {result['chunks']} chunks in {result['seconds']:.1f}s "
+              f"({result['chunks_per_sec']} chunks/sec, peak RSS {peak_rss_mb():.0f} MB)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthetic", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--write-batch-size", type=int, default=1024)
+    parser.add_argument("--processes", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = load_embeddings()
+    with EmbeddingPipeline(embeddings, batch_size=args.batch_size, processes=args.processes) as pipeline:
+        run("sample", sample_chunks(), pipeline, args.write_batch_size)
+        if args.synthetic:
+            run("synthetic", synthetic_chunks(args.synthetic), pipeline, args.write_batch_size)
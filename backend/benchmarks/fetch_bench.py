@@ -0,0 +1,116 @@
+"""
+Fetcher benchmark against a local stand-in for docs.aws.amazon.com
+
+Serves fixture HTML pages (built from SAMPLE_DOCS) from an in-process HTTP
+server that sets ETag/Last-Modified and answers conditional requests with
+304. Compares a sequential fetch, a concurrent cold fetch and a warm
+re-fetch that should be served entirely from the on-disk cache. All pages
+share one host, like the real docs.aws.amazon.com URLs, so these runs use
+the per-host interval a real scrape uses (SCRAPE_HOST_INTERVAL unless
+--host-interval is given); a concurrent run without the limit is reported
+next to them for comparison only.
+
+Usage:
+    python benchmarks/fetch_bench.py --pages 40 --latency 0.2
+    python benchmarks/fetch_bench.py --host-interval 0.25
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fetcher import SCRAPE_HOST_INTERVAL  # noqa: E402
+from ingest_docs import SAMPLE_DOCS, scrape_all_docs  # noqa: E402
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def build_fixture_pages(num_pages: int) -> dict:
+    pages = {}
+    for i in range(num_pages):
+        doc = SAMPLE_DOCS[i % len(SAMPLE_DOCS)]
+        body = (f"<html><head><title>{doc['title']}</title><script>var x = 1;</script></head>"
+                f"<body><nav>Menu</nav><h1>{doc['title']}</h1><pre>{doc['content']}</pre>"
+                f"<footer>Footer</footer></body></html>").encode("utf-8")
+        pages[f"/docs/page-{i}.html"] = body
+    return pages
+
+
+def make_handler(pages: dict, latency: float, stats: dict):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = pages.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                stats["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            stats["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def run_benchmark(num_pages: int, latency: float, workers: int, host_interval: float):
+    pages = build_fixture_pages(num_pages)
+    stats = {"200": 0, "304": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(pages, latency, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = {"fixture": [base_url + path for path in pages]}
+
+    cache_root = tempfile.mkdtemp(prefix="http_cache_")
+    try:
+        print(f"Per-host interval {host_interval:g}s, {workers} workers, {latency:g}s server latency")
+        runs = [
+            ("sequential", 1, host_interval, os.path.join(cache_root, "sequential")),
+            ("concurrent", workers, host_interval, os.path.join(cache_root, "shared")),
+            ("no host limit", workers, 0.0, os.path.join(cache_root, "unlimited")),
+            ("warm cache", workers, host_interval, os.path.join(cache_root, "shared")),
+        ]
+        for label, run_workers, interval, cache_dir in runs:
+            before = dict(stats)
+            start = time.perf_counter()
+            documents, failed = scrape_all_docs(urls, max_workers=run_workers,
+                                                cache_dir=cache_dir, host_interval=interval)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>13}: {len(documents)} docs in {elapsed:.2f}s "
+                  f"(200s: {stats['200'] - before['200']}, 304s: {stats['304'] - before['304']}, "
+                  f"failed: {len(failed)})")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--host-interval", type=float, default=SCRAPE_HOST_INTERVAL,
+                        help="seconds between requests to one host (default: SCRAPE_HOST_INTERVAL)")
+    args = parser.parse_args()
+    run_benchmark(args.pages, args.latency, args.workers, args.host_interval)
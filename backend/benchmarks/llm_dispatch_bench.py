@@ -0,0 +1,99 @@
+"""
+LLM dispatch benchmark: burst load against a stub provider that throttles
+
+The stub enforces a requests-per-minute quota (429 with retry_after once
+used up) and fails a share of calls with a 503. A burst of background and
+quiz calls arrives first, then a burst of chat calls. Runs it twice:
+  - direct:     every call goes straight to the provider (the old behaviour)
+  - dispatched: through LLMDispatcher (token bucket, priority queue, retries)
+and reports failures, retries and queue wait per priority. Pass a
+--limit-rpm above --quota-rpm to see the adaptive rate find the real quota.
+
+Usage:
+    python benchmarks/llm_dispatch_bench.py --quota-rpm 600 --chat 300 --quiz 150 --background 150
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e_bench import summarize  # noqa: E402
+from llm import StubProvider  # noqa: E402
+from llm_dispatch import (  # noqa: E402
+    LLMDispatcher, LLMUnavailable, PRIORITY_BACKGROUND, PRIORITY_CHAT, PRIORITY_NAMES, PRIORITY_QUIZ
+)
+
+PROMPT = "What is Amazon SageMaker?"
+
+
+async def _one(provider, dispatcher, priority: int, results: dict):
+    start = time.perf_counter()
+    try:
+        if dispatcher is None:
+            await provider.agenerate(PROMPT)
+        else:
+            await dispatcher.call(lambda: provider.agenerate(PROMPT), priority, 10)
+            dispatcher.settle(provider.output_tokens)
+        outcome = "ok"
+    except LLMUnavailable:
+        outcome = "gave_up"
+    except Exception:
+        outcome = "failed"
+    results[priority].append((outcome, (time.perf_counter() - start) * 1000))
+
+
+async def _burst(provider, dispatcher, args) -> dict:
+    results = {priority: [] for priority in PRIORITY_NAMES}
+    early = [_one(provider, dispatcher, PRIORITY_BACKGROUND, results) for _ in range(args.background)]
+    early += [_one(provider, dispatcher, PRIORITY_QUIZ, results) for _ in range(args.quiz)]
+    tasks = [asyncio.ensure_future(call) for call in early]
+    await asyncio.sleep(0.1)
+    tasks += [asyncio.ensure_future(_one(provider, dispatcher, PRIORITY_CHAT, results))
+              for _ in range(args.chat)]
+    await asyncio.gather(*tasks)
+    return results
+
+
+def report(label: str, results: dict, elapsed: float, dispatcher=None):
+    print(f"{label} ({elapsed:.1f}s):")
+    for priority, name in PRIORITY_NAMES.items():
+        outcomes = [outcome for outcome, _ in results[priority]]
+        latency = summarize([ms for outcome, ms in results[priority] if outcome == "ok"])
+        print(f"  {name:>10}: {outcomes.count('ok'):>4} ok  {outcomes.count('failed'):>4} failed  "
+              f"{outcomes.count('gave_up'):>4} gave up  "
+              f"p50 {latency['p50_ms'] / 1000:6.2f}s  p95 {latency['p95_ms'] / 1000:6.2f}s")
+    if dispatcher is not None:
+        stats = dispatcher.stats()
+        print(f"  retries {stats['retries']}, 429s {stats['throttled']}, "
+              f"rate now {stats['rpm_current']:g}/{stats['rpm_limit']:g} RPM")
+
+
+def run_benchmark(args):
+    for label in ("direct", "dispatched"):
+        provider = StubProvider(latency_ms=args.llm_latency_ms, tokens_per_sec=0, output_tokens=20,
+                                quota_rpm=args.quota_rpm, error_rate=args.error_rate)
+        dispatcher = None
+        if label == "dispatched":
+            dispatcher = LLMDispatcher(rpm=args.limit_rpm or args.quota_rpm, backoff_base=0.5,
+                                       queue_timeout=args.queue_timeout)
+        start = time.perf_counter()
+        results = asyncio.run(_burst(provider, dispatcher, args))
+        report(label, results, time.perf_counter() - start, dispatcher)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quota-rpm", type=int, default=600, help="the stub provider's quota")
+    parser.add_argument("--limit-rpm", type=int, default=0, help="dispatcher limit (default: the quota)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of calls failing with 503")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--chat", type=int, default=300)
+    parser.add_argument("--quiz", type=int, default=150)
+    parser.add_argument("--background", type=int, default=150)
+    parser.add_argument("--queue-timeout", type=float, default=120)
+    run_benchmark(parser.parse_args())
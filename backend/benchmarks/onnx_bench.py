@@ -0,0 +1,110 @@
+"""
+Embedding backend benchmark: PyTorch vs int8-quantized ONNX Runtime
+
+Runs each backend in a fresh process (so imports and RSS are not shared)
+and reports the time to import and load the model, RSS once loaded,
+single-query latency and batch throughput over the SAMPLE_DOCS chunks.
+Then asserts that the ONNX vectors agree with the PyTorch ones (cosine at
+least --min-cosine for every text of the fixed sample) and exits non-zero
+if they do not. Export the model first:
+
+    python onnx_embeddings.py --export
+
+Usage:
+    python benchmarks/onnx_bench.py --queries 500
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily below: the child processes time their own imports
+BACKENDS = ["torch", "onnx"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(backend: str, num_queries: int, repeat: int) -> dict:
+    """Runs in the child process: everything a server worker would pay for"""
+    start = time.perf_counter()
+    from embedding import load_embeddings
+
+    model = load_embeddings(backend=backend)
+    load_seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+
+    from e2e_bench import CHAT_QUESTIONS, summarize
+    from onnx_embeddings import verification_texts
+
+    model.embed_query("warm up")
+    latencies = []
+    for i in range(num_queries):
+        question = f"{CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]} #{i}"
+        query_start = time.perf_counter()
+        model.embed_query(question)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+    texts = verification_texts() * repeat
+    batch_start = time.perf_counter()
+    model.embed_documents(texts)
+    batch_seconds = time.perf_counter() - batch_start
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": round(rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "texts_per_sec": round(len(texts) / batch_seconds, 1),
+        **summarize(latencies),
+    }
+
+
+def run_child(backend: str, args) -> dict:
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", backend,
+         "--queries", str(args.queries), "--repeat", str(args.repeat)],
+        cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--queries", type=int, default=500, help="single-query embeddings per backend")
+    parser.add_argument("--repeat", type=int, default=10, help="copies of the test set in the batch run")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.queries, args.repeat)))
+        return
+
+    print(f"{'backend':>8}  {'load s':>7}  {'RSS MB':>7}  {'peak MB':>8}  {'p50 ms':>7}  {'p99 ms':>7}  texts/s")
+    for backend in args.backends:
+        r = run_child(backend, args)
+        print(f"{backend:>8}  {r['load_seconds']:>7.2f}  {r['rss_mb']:>7.0f}  {r['peak_rss_mb']:>8.0f}  "
+              f"{r['p50_ms']:>7.2f}  {r['p99_ms']:>7.2f}  {r['texts_per_sec']:>7.1f}")
+
+    if "onnx" in args.backends:
+        from embedding import EMBEDDING_MODEL
+        from onnx_embeddings import verify
+
+        if not verify(EMBEDDING_MODEL, min_cosine=args.min_cosine):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
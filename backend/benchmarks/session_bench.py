@@ -0,0 +1,134 @@
+"""
+Session store benchmark: memory per session and per-request cost
+
+Fills each session backend with synthetic conversations and reports the
+memory held per session (tracemalloc for the in-process store, database
+file size for SQLite) and the history lookup time. Then compares the /chat
+request body size and ChatRequest validation time when the client resends
+the whole conversation_history against sending only a session_id.
+
+Usage:
+    python benchmarks/session_bench.py --sessions 2000 --turns 10 20 50
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from conversation import Turn  # noqa: E402
+from session_store import MemorySessionStore, SQLiteSessionStore  # noqa: E402
+
+QUESTION = "How does Amazon SageMaker Model Monitor detect data drift in a production endpoint? "
+ANSWER = ("SageMaker Model Monitor captures endpoint requests and compares their statistics with a "
+          "baseline computed from the training data. ") * 10
+
+
+def conversation(index: int, turns: int) -> list:
+    # Distinct strings per turn, as real messages would be
+    return [Turn("user" if i % 2 == 0 else "assistant", f"{QUESTION if i % 2 == 0 else ANSWER}#{index}-{i}")
+            for i in range(turns)]
+
+
+def fill(store, num_sessions: int, turns: int) -> list:
+    ids = []
+    for index in range(num_sessions):
+        session_id = store.create()
+        history = conversation(index, turns)
+        # One exchange per request, as /chat appends them
+        for i in range(0, len(history), 2):
+            store.append(session_id, history[i:i + 2])
+        ids.append(session_id)
+    return ids
+
+
+def lookup_us(store, ids: list) -> float:
+    start = time.perf_counter()
+    for session_id in ids:
+        store.get(session_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def bench_memory_store(num_sessions: int, turns: int) -> dict:
+    store = MemorySessionStore(max_bytes=1 << 40, max_turns=turns)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ids = fill(store, num_sessions, turns)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        "bytes_per_session": held // num_sessions,
+        "text_bytes_per_session": store.stats()["turn_bytes"] // num_sessions,
+        "lookup_us": round(lookup_us(store, ids), 2),
+    }
+
+
+def bench_sqlite_store(num_sessions: int, turns: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"sessions-{turns}.sqlite3")
+    store = SQLiteSessionStore(path, max_bytes=1 << 40, max_turns=turns)
+    ids = fill(store, num_sessions, turns)
+    store._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {
+        "disk_bytes_per_session": os.path.getsize(path) // num_sessions,
+        "lookup_us": round(lookup_us(store, ids), 2),
+    }
+
+
+def bench_requests(turns: int, iterations: int) -> dict:
+    from main import ChatRequest
+
+    history = [turn._asdict() for turn in conversation(0, turns)]
+    full = json.dumps({"question": QUESTION, "conversation_history": history})
+    session = json.dumps({"question": QUESTION, "session_id": "x" * 22})
+
+    def validate_us(body: str) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            ChatRequest.model_validate_json(body)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    return {
+        "history_body_bytes": len(full),
+        "session_body_bytes": len(session),
+        "history_validate_us": round(validate_us(full), 2),
+        "session_validate_us": round(validate_us(session), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--iterations", type=int, default=2000, help="validations per request shape")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="session_bench_")
+    try:
+        for turns in args.turns:
+            memory = bench_memory_store(args.sessions, turns)
+            sqlite = bench_sqlite_store(args.sessions, turns, workdir)
+            requests = bench_requests(turns, args.iterations)
+            print(f"{turns} turns x {args.sessions} sessions")
+            print(f"  memory store: {memory['bytes_per_session'] / 1024:8.1f} KiB/session "
+                  f"({memory['text_bytes_per_session'] / 1024:.1f} KiB of text), "
+                  f"lookup {memory['lookup_us']:.1f}us")
+            print(f"  sqlite store: {sqlite['disk_bytes_per_session'] / 1024:8.1f} KiB/session on disk, "
+                  f"lookup {sqlite['lookup_us']:.1f}us")
+            print(f"  /chat body:   {requests['history_body_bytes'] / 1024:8.1f} KiB with history "
+                  f"({requests['history_validate_us']:.1f}us to validate) vs "
+                  f"{requests['session_body_bytes']} B with session_id "
+                  f"({requests['session_validate_us']:.1f}us)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
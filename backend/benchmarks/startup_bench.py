@@ -0,0 +1,112 @@
+"""
+Startup benchmark: time-to-listening, time-to-ready and first-query latency
+
+Builds a fixture index from SAMPLE_DOCS, then starts uvicorn with the stub
+LLM several times and measures, from process spawn:
+  - listening: first 200 from the liveness endpoint /
+  - ready:     first 200 from /ready (model loaded and warmed up)
+  - first /chat latency once ready
+Also reports how long `import main` takes on its own.
+
+Usage:
+    python benchmarks/startup_bench.py --runs 5
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def server_environment(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBED_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "ANSWER_CACHE_ENABLED": "false",
+        "QUIZ_BANK_ENABLED": "false",
+        "LLM_PROVIDER": "stub",
+        "STUB_LLM_LATENCY_MS": "0",
+    })
+    return env
+
+
+def import_seconds(env: dict) -> float:
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, deadline: float) -> float:
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return time.perf_counter()
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} not ready in time")
+
+
+def one_run(env: dict, port: int, timeout: float) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + timeout
+        listening = wait_for(base_url + "/", deadline) - start
+        ready = wait_for(base_url + "/ready", deadline) - start
+        query_start = time.perf_counter()
+        requests.post(base_url + "/chat", json={"question": "How does Amazon Comprehend detect PII?"},
+                      timeout=60).raise_for_status()
+        first_query = time.perf_counter() - query_start
+        return {"listening": listening, "ready": ready, "first_query": first_query}
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    try:
+        env = server_environment(workdir)
+        print("📚 Building fixture index from SAMPLE_DOCS...")
+        subprocess.run(
+            [sys.executable, "-c", "import ingest_docs; ingest_docs.ingest_documents(use_sample_data=True)"],
+            cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+
+        print(f"  import main:        {import_seconds(env):6.2f}s")
+        runs = [one_run(env, args.port, args.timeout) for _ in range(args.runs)]
+        for name, label in (("listening", "time-to-listening"), ("ready", "time-to-ready"),
+                            ("first_query", "first /chat")):
+            values = [run[name] for run in runs]
+            print(f"  {label + ':':<19} median {statistics.median(values):6.2f}s  "
+                  f"min {min(values):6.2f}s  max {max(values):6.2f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
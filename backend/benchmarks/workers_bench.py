@@ -0,0 +1,195 @@
+"""
+Multi-worker scaling benchmark: throughput and memory per worker count
+
+Builds a fixture index from SAMPLE_DOCS, then for each worker count starts
+gunicorn (gunicorn.conf.py) on a local port with the stub LLM and drives
+/chat over HTTP. The answer and embedding caches are disabled so every
+request embeds and searches, which is the CPU-bound part that extra
+workers should scale. Reports throughput, latency, and the summed RSS and
+PSS of the master and workers. RSS counts shared pages once per process;
+PSS splits them, so it shows what the preloaded model really costs.
+
+Run once with the default preload and once with --no-preload to see the
+difference sharing makes.
+
+Usage:
+    python benchmarks/workers_bench.py --workers 1 2 4 8 --requests 400
+    python benchmarks/workers_bench.py --workers 1 2 4 8 --no-preload
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e_bench import CHAT_QUESTIONS, summarize  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def server_environment(workdir: str, args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBED_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        "QUIZ_BANK_ENABLED": "false",
+        "SESSION_BACKEND": "off",
+        "LLM_PROVIDER": "stub",
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "STUB_LLM_TOKENS_PER_SEC": "0",
+        "PRELOAD_SHARED_STATE": "false" if args.no_preload else "true",
+    })
+    return env
+
+
+def build_fixture(env: dict):
+    subprocess.run(
+        [sys.executable, "-c", "import ingest_docs; ingest_docs.ingest_documents(use_sample_data=True)"],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def process_tree(pid: int) -> list:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return pids
+    for child in children:
+        pids.extend(process_tree(child))
+    return pids
+
+
+def memory_mb(pid: int) -> dict:
+    """Summed RSS and PSS (MiB) of a process and its descendants"""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+    for proc in process_tree(pid):
+        try:
+            with open(f"/proc/{proc}/smaps_rollup") as f:
+                for line in f:
+                    field, value = line.split()[:2]
+                    if field == "Rss:":
+                        totals["rss_mb"] += int(value) / 1024
+                    elif field == "Pss:":
+                        totals["pss_mb"] += int(value) / 1024
+        except OSError:
+            continue
+    return {name: round(value, 1) for name, value in totals.items()}
+
+
+def wait_until_ready(base_url: str, workers: int, timeout: float):
+    """Wait until a run of health checks in a row all report an initialized RAG system"""
+    deadline = time.time() + timeout
+    ready = 0
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=5).json().get("rag_initialized"):
+                ready += 1
+                if ready >= workers * 4:
+                    return
+                continue
+        except (requests.RequestException, ValueError):
+            pass
+        ready = 0
+        time.sleep(0.5)
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+
+def drive(base_url: str, num_requests: int, concurrency: int) -> dict:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one(index: int):
+        start = time.perf_counter()
+        response = session.post(base_url + "/chat",
+                                json={"question": f"{CHAT_QUESTIONS[index % len(CHAT_QUESTIONS)]} #{index}"})
+        return response.status_code, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(num_requests)))
+    wall = time.perf_counter() - start
+    latencies = [elapsed for status, elapsed in results if status == 200]
+    return {
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "errors": len(results) - len(latencies),
+        "latency": summarize(latencies),
+    }
+
+
+def run_level(workers: int, env: dict, args) -> dict:
+    env = dict(env, WEB_CONCURRENCY=str(workers), PORT=str(args.port))
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                              cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        started = time.perf_counter()
+        wait_until_ready(base_url, workers, args.startup_timeout)
+        startup = time.perf_counter() - started
+        idle = memory_mb(server.pid)
+        drive(base_url, min(args.requests, 50), args.concurrency)  # warm-up
+        result = drive(base_url, args.requests, args.concurrency)
+        loaded = memory_mb(server.pid)
+        return {"workers": workers, "startup_seconds": round(startup, 1),
+                "idle": idle, "loaded": loaded, **result}
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=400, help="requests per worker count")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--no-preload", action="store_true", help="load the model in every worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="workers_bench_")
+    try:
+        env = server_environment(workdir, args)
+        print("📚 Building fixture index from SAMPLE_DOCS...")
+        build_fixture(env)
+
+        mode = "per-worker load" if args.no_preload else "preloaded + shared"
+        print(f"🏃 {args.requests} /chat requests at concurrency {args.concurrency} ({mode}):")
+        results = []
+        for workers in args.workers:
+            result = run_level(workers, env, args)
+            results.append(result)
+            print(f"  {workers} worker(s): {result['throughput_rps']:>7.1f} req/s  "
+                  f"p50 {result['latency']['p50_ms']:>7.1f}ms  p99 {result['latency']['p99_ms']:>7.1f}ms  "
+                  f"RSS {result['loaded']['rss_mb']:>7.1f} MB  PSS {result['loaded']['pss_mb']:>7.1f} MB  "
+                  f"errors {result['errors']}  (ready in {result['startup_seconds']}s)")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2)
+            print(f"📊 Results written to {args.output}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Token-budgeted context packing for the chat prompt.
+
+Chunks are taken in relevance order until the token budget is full. Text
+that a chunk shares with an already selected neighbour from the same page
+(the splitter's chunk_overlap) is cut out first, so the model never pays
+for the same span twice.
+"""
+
+import os
+from typing import List, NamedTuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Below this many tokens a truncated chunk is not worth including
+CONTEXT_MIN_PARTIAL_TOKENS = int(os.getenv("CONTEXT_MIN_PARTIAL_TOKENS", "64"))
+# Must cover the splitter's chunk_overlap (200 chars in ingest_docs.py)
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+
+# tiktoken's cl100k_base is not Gemini's tokenizer, but tracks it closely
+# enough for budgeting. Falls back to ~4 chars per token if unavailable.
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️  tiktoken unavailable ({e}); estimating tokens from length")
+            _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right"""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def remove_overlap(text: str, neighbours: List[str]) -> str:
+    """Trim spans of text that repeat the edges of already selected chunks"""
+    for other in neighbours:
+        head = _overlap(other, text)
+        if head:
+            text = text[head:]
+        tail = _overlap(text, other)
+        if tail:
+            text = text[:-tail]
+    return text
+
+
+class PackedContext(NamedTuple):
+    text: str
+    docs: list  # chunks that contributed to the context, in relevance order
+    tokens: int
+    dropped: int  # chunks left out because the budget was full
+
+
+def pack_context(docs, budget: int = CONTEXT_TOKEN_BUDGET, separator: str = "\n\n") -> PackedContext:
+    """Fill the token budget with the most relevant, de-duplicated chunk text"""
+    parts, used, by_source = [], [], {}
+    remaining = budget
+    separator_tokens = count_tokens(separator)
+
+    for index, doc in enumerate(docs):
+        source = doc.metadata.get("source", "") if hasattr(doc, "metadata") else ""
+        text = remove_overlap(doc.page_content.strip(), by_source.get(source, []))
+        if not text.strip():
+            continue
+
+        cost = count_tokens(text) + (separator_tokens if parts else 0)
+        if cost > remaining:
+            available = remaining - (separator_tokens if parts else 0)
+            if available < CONTEXT_MIN_PARTIAL_TOKENS:
+                return PackedContext(separator.join(parts), used, budget - remaining, len(docs) - index)
+            text = truncate_to_tokens(text, available)
+            cost = count_tokens(text) + (separator_tokens if parts else 0)
+
+        parts.append(text)
+        used.append(doc)
+        by_source.setdefault(source, []).append(doc.page_content)
+        remaining -= cost
+        if remaining <= 0:
+            return PackedContext(separator.join(parts), used, budget - remaining, len(docs) - index - 1)
+
+    return PackedContext(separator.join(parts), used, budget - remaining, 0)
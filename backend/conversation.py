@@ -0,0 +1,202 @@
+"""
+Bounded conversation memory for /chat.
+
+The frontend resends the whole conversation_history with every question.
+Only the newest turns that fit HISTORY_TOKEN_BUDGET go into the prompt
+verbatim; older turns are folded into a running summary that is built in
+the background by the LLM and cached by a chained hash of the turns it
+covers, so the resent history hits the cache on the next request. Until a
+summary lands, the rolled-off questions are noted verbatim. Either way the
+history section of the prompt is capped, so prompt size and latency stay
+flat as a conversation grows.
+
+Follow-up questions ("how does it compare to Textract?") are turned into a
+standalone retrieval query, by default cheaply by appending the previous
+question, or with an extra LLM call when QUERY_REWRITE_MODE=llm.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from context_builder import count_tokens, truncate_to_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+HISTORY_TURN_MAX_TOKENS = int(os.getenv("HISTORY_TURN_MAX_TOKENS", "200"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "200"))
+# Rolled-off turns collected before they are folded into the summary (one LLM call each time)
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1000"))
+# heuristic (append the previous question), llm (rewrite with the model) or off
+QUERY_REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "heuristic").lower()
+
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|one|ones|same|above|previous|"
+    r"compare|compared|instead|else)\b",
+    re.IGNORECASE,
+)
+
+
+class Turn(NamedTuple):
+    role: str  # "user" or "assistant"
+    content: str
+
+
+class ConversationContext(NamedTuple):
+    query: str  # standalone retrieval query
+    history: str  # summary and recent turns for the prompt ("" without history)
+    follow_up: bool
+
+
+def normalize_history(history) -> List[Turn]:
+    """Turns from conversation_history (or a session), skipping malformed entries"""
+    turns = []
+    for item in history or []:
+        if isinstance(item, Turn):
+            turns.append(item)
+            continue
+        if not isinstance(item, dict):
+            continue
+        content = str(item.get("content") or "").strip()
+        if content:
+            turns.append(Turn("assistant" if item.get("role") == "assistant" else "user", content))
+    return turns
+
+
+def is_follow_up(question: str, turns: List[Turn]) -> bool:
+    """Whether the question leans on earlier turns (refers back with a pronoun etc.)"""
+    return bool(turns) and FOLLOW_UP_PATTERN.search(question) is not None
+
+
+def heuristic_query(question: str, turns: List[Turn]) -> str:
+    """Standalone query: the follow-up plus the previous question, which names the subject"""
+    previous = [turn.content for turn in turns if turn.role == "user"]
+    if not previous:
+        return question
+    return f"{question} {truncate_to_tokens(previous[-1], HISTORY_TURN_MAX_TOKENS)}"
+
+
+def format_turn(turn: Turn) -> str:
+    speaker = "Student" if turn.role == "user" else "Instructor"
+    return f"{speaker}: {truncate_to_tokens(turn.content, HISTORY_TURN_MAX_TOKENS)}"
+
+
+def split_window(turns: List[Turn], budget: int) -> Tuple[List[Turn], List[str]]:
+    """Turns that rolled off, and the newest formatted turns that fit the token budget"""
+    window, used = [], 0
+    for index in range(len(turns) - 1, -1, -1):
+        line = format_turn(turns[index])
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            return turns[:index + 1], window[::-1]
+        window.append(line)
+        used += cost
+    return [], window[::-1]
+
+
+def prefix_keys(turns: List[Turn]) -> List[str]:
+    """Chained hashes: keys[i] identifies turns[:i + 1]"""
+    keys, digest = [], ""
+    for turn in turns:
+        digest = hashlib.sha256(f"{digest}\0{turn.role}\0{turn.content}".encode("utf-8")).hexdigest()
+        keys.append(digest)
+    return keys
+
+
+class ConversationMemory:
+    """Builds the bounded history section and retrieval query for a chat request"""
+
+    def __init__(self, summarize: Callable[[str, str], Awaitable[str]],
+                 rewrite: Optional[Callable[[str, str], Awaitable[str]]] = None,
+                 window_tokens: int = HISTORY_TOKEN_BUDGET,
+                 summary_tokens: int = HISTORY_SUMMARY_TOKENS,
+                 summary_batch: int = HISTORY_SUMMARY_BATCH,
+                 cache_size: int = HISTORY_SUMMARY_CACHE_SIZE):
+        self.summarize = summarize
+        self.rewrite = rewrite
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_batch = summary_batch
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()  # prefix key -> summary text
+        self._pending = {}  # prefix key -> background task
+        self.summary_hits = 0
+        self.summaries_built = 0
+        self.rewrites = 0
+
+    def _cached_summary(self, keys: List[str]) -> Tuple[int, str]:
+        """Longest summarized prefix: (turns covered, summary)"""
+        for covered in range(len(keys), 0, -1):
+            summary = self._summaries.get(keys[covered - 1])
+            if summary is not None:
+                self._summaries.move_to_end(keys[covered - 1])
+                return covered, summary
+        return 0, ""
+
+    def summary_for(self, older: List[Turn]) -> str:
+        """Summary of the rolled-off turns without waiting on the LLM"""
+        if not older:
+            return ""
+        keys = prefix_keys(older)
+        covered, summary = self._cached_summary(keys)
+        if covered == len(older):
+            self.summary_hits += 1
+            return summary
+
+        unsummarized = older[covered:]
+        if len(unsummarized) >= self.summary_batch:
+            self._schedule(keys[-1], summary, unsummarized)
+        notes = "; ".join(turn.content for turn in unsummarized if turn.role == "user")
+        if notes:
+            summary = f"{summary}\nEarlier questions: {notes}".strip()
+        return truncate_to_tokens(summary, self.summary_tokens)
+
+    def _schedule(self, key: str, summary: str, turns: List[Turn]):
+        if key not in self._pending:
+            self._pending[key] = asyncio.create_task(self._build(key, summary, turns))
+
+    async def _build(self, key: str, summary: str, turns: List[Turn]):
+        try:
+            text = await self.summarize(summary, "\n".join(format_turn(turn) for turn in turns))
+            self._summaries[key] = truncate_to_tokens(text.strip(), self.summary_tokens)
+            self.summaries_built += 1
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        except Exception as e:
+            print(f"⚠️  Conversation summary failed: {e}")
+        finally:
+            self._pending.pop(key, None)
+
+    async def prepare(self, question: str, history) -> ConversationContext:
+        turns = normalize_history(history)
+        if not turns:
+            return ConversationContext(question, "", False)
+
+        older, window = split_window(turns, self.window_tokens)
+        summary = self.summary_for(older)
+        lines = ([f"Summary of earlier conversation: {summary}"] if summary else []) + window
+        history_text = "\n".join(lines)
+
+        follow_up = is_follow_up(question, turns)
+        query = question
+        if follow_up and QUERY_REWRITE_MODE != "off":
+            query = heuristic_query(question, turns)
+            if self.rewrite is not None:
+                try:
+                    query = (await self.rewrite(question, history_text)).strip() or query
+                    self.rewrites += 1
+                except Exception as e:
+                    print(f"⚠️  Query rewrite failed, using heuristic query: {e}")
+        return ConversationContext(query, history_text, follow_up)
+
+    def stats(self) -> dict:
+        return {
+            "summaries_cached": len(self._summaries),
+            "summary_hits": self.summary_hits,
+            "summaries_built": self.summaries_built,
+            "summaries_pending": len(self._pending),
+            "llm_rewrites": self.rewrites,
+        }
@@ -0,0 +1,50 @@
+"""
+Exact nearest-neighbour search over the whole collection as one matrix product.
+
+/chat/batch embeds all of its questions at once. Instead of one Chroma query
+per question, the question vectors are scored against every chunk with a
+single (questions x chunks) matrix multiply. MiniLM vectors are normalized,
+so the dot product is the cosine similarity and the ranking matches Chroma's
+L2 search. The matrix is read from the collection on first use and reloaded
+when the index version changes.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class DenseMatrix:
+    """All chunk embeddings of a collection as one normalized float32 matrix"""
+
+    def __init__(self, documents: List[Document], vectors: np.ndarray, version=None):
+        self.documents = documents
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+        self.version = version
+
+    @classmethod
+    def from_collection(cls, collection, version=None) -> "DenseMatrix":
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        documents = [Document(page_content=text or "", metadata=metadata or {})
+                     for text, metadata in zip(data["documents"], data["metadatas"])]
+        embeddings = data["embeddings"]
+        if embeddings is None or not len(embeddings):
+            return cls([], np.zeros((0, 0), dtype=np.float32), version)
+        return cls(documents, np.asarray(embeddings, dtype=np.float32), version)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, queries: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        """Top-k chunks for every query vector, best first"""
+        if not len(self.documents):
+            return [[] for _ in queries]
+        k = min(k, len(self.documents))
+        scores = np.asarray(queries, dtype=np.float32) @ self.vectors.T
+        # Unordered top k per row, then sort just those
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        ranked = np.take_along_axis(top, order, axis=1)
+        return [[self.documents[i] for i in row] for row in ranked]
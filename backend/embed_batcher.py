@@ -0,0 +1,80 @@
+"""
+Micro-batching of query embeddings across concurrent requests.
+
+Each /chat request embeds a single question, and a batch-size-1 transformer
+pass is the least efficient way to run MiniLM on a CPU. The batcher holds
+the first query for up to EMBED_BATCH_WINDOW_MS (or until EMBED_BATCH_MAX
+queries are waiting), then encodes everything that arrived in one
+embed_documents call on the embed pool. Every caller gets its own vector
+back; identical texts in a batch are encoded once. Set the window to 0 to
+embed each query on its own.
+"""
+
+import asyncio
+import os
+from typing import List
+
+from executors import run_in_stage
+
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embed_query calls into batched forward passes"""
+
+    def __init__(self, embeddings, window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 max_batch: int = EMBED_BATCH_MAX):
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+
+    async def embed_query(self, text: str) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._encode(batch))
+
+    async def _encode(self, batch: list):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            vectors = await run_in_stage("embed", self.embeddings.embed_documents, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            # Callers that gave up (e.g. a disconnected client) have cancelled their future
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
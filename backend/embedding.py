@@ -0,0 +1,178 @@
+"""
+Embedding model loading and the batched embedding pipeline used at ingest.
+
+The pipeline streams chunks through in bounded write batches, sorts each
+batch by text length to cut padding waste, optionally fans the encoding
+out over a multi-process pool, and writes the vectors straight to Chroma.
+"""
+
+import os
+import time
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, EMBED_CACHE_ENABLED
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# "torch" (sentence-transformers) or "onnx" (int8-quantized, see onnx_embeddings.py).
+# Both produce EMBEDDING_MODEL vectors, so indexes and caches are shared.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BACKENDS = ("torch", "onnx")
+# Texts per transformer forward pass (PyTorch backend; ONNX uses ONNX_BATCH_SIZE)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Chunks embedded and written to Chroma per step; bounds memory use
+EMBED_WRITE_BATCH_SIZE = int(os.getenv("EMBED_WRITE_BATCH_SIZE", "1024"))
+# Worker processes for ingest-time encoding (0 or 1 disables the pool)
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+
+
+def open_embedding_cache() -> Optional[EmbeddingCache]:
+    """Open the shared on-disk embedding cache, if enabled"""
+    if not EMBED_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(EMBEDDING_MODEL)
+
+
+def check_embedding_backend(backend: str = EMBEDDING_BACKEND):
+    """Fail fast on a backend that cannot load (unknown name, ONNX model not exported)"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+    if backend == "onnx":
+        from onnx_embeddings import check_model_files
+
+        check_model_files()
+
+
+def load_embeddings(cache: Optional[EmbeddingCache] = None, model=None,
+                    backend: str = EMBEDDING_BACKEND):
+    """
+    Load the local embedding model (no API limits) on the given backend.
+    Pass an already loaded model (e.g. one preloaded before forking
+    workers) to only wrap it with the cache.
+    """
+    if model is not None:
+        return CachedEmbeddings(model, cache) if cache is not None else model
+
+    check_embedding_backend(backend)
+    print(f"🔧 Loading local embedding model ({backend})...")
+    if backend == "onnx":
+        from onnx_embeddings import OnnxEmbeddings
+
+        embeddings = OnnxEmbeddings()
+    else:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,  # Fast, lightweight model
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBED_BATCH_SIZE}
+        )
+    print("✅ Embedding model loaded!")
+    if cache is not None:
+        return CachedEmbeddings(embeddings, cache)
+    return embeddings
+
+
+class EmbeddingPipeline:
+    """Batched (and optionally multi-process) encoder around a SentenceTransformer or OnnxEmbeddings"""
+
+    def __init__(self, embeddings, batch_size: Optional[int] = None,
+                 processes: int = EMBED_PROCESSES, cache: Optional[EmbeddingCache] = None):
+        self.model = embeddings.client  # the underlying SentenceTransformer, or OnnxEmbeddings itself
+        # OnnxEmbeddings carries its own (smaller) batch size
+        self.batch_size = batch_size or getattr(self.model, "batch_size", EMBED_BATCH_SIZE)
+        self.processes = processes
+        self.cache = cache
+        self._pool = None
+
+    def __enter__(self):
+        # The ONNX session already runs intra-op threads over every core
+        if self.processes > 1 and hasattr(self.model, "start_multi_process_pool"):
+            self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Encode texts, returning normalized vectors in input order"""
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._encode(texts)
+
+        found = self.cache.get_many(texts)
+        missing = [i for i in range(len(texts)) if i not in found]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = self._encode(missing_texts)
+            self.cache.put_many(missing_texts, vectors)
+            found.update(zip(missing, vectors))
+        return [found[i] for i in range(len(texts))]
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        # Longest first so every batch holds similar lengths
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+
+        if self._pool is not None:
+            vectors = self.model.encode_multi_process(
+                sorted_texts, self._pool, batch_size=self.batch_size
+            )
+            # encode_multi_process has no normalize flag
+            norms = (vectors ** 2).sum(axis=1, keepdims=True) ** 0.5
+            vectors = vectors / norms.clip(min=1e-12)
+        else:
+            vectors = self.model.encode(
+                sorted_texts, batch_size=self.batch_size, normalize_embeddings=True,
+                show_progress_bar=False
+            )
+
+        result = [None] * len(texts)
+        for position, index in enumerate(order):
+            result[index] = vectors[position].tolist()
+        return result
+
+
+def _batched(iterable: Iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def index_documents(collection, pipeline: EmbeddingPipeline, items: Iterable[Tuple[str, object]],
+                    write_batch_size: int = EMBED_WRITE_BATCH_SIZE,
+                    log_every: Optional[int] = 10) -> dict:
+    """
+    Embed (id, Document) pairs and upsert them into a Chroma collection.
+
+    Items are consumed lazily in write batches, so only one batch of texts
+    and vectors is held in memory at a time.
+    """
+    start = time.perf_counter()
+    total = 0
+    for batch_number, batch in enumerate(_batched(items, write_batch_size), start=1):
+        ids = [item_id for item_id, _ in batch]
+        texts = [doc.page_content for _, doc in batch]
+        collection.upsert(
+            ids=ids,
+            embeddings=pipeline.embed(texts),
+            metadatas=[doc.metadata for _, doc in batch],
+            documents=texts,
+        )
+        total += len(batch)
+        if log_every and batch_number % log_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"   ... {total} chunks embedded ({total / elapsed:.0f} chunks/sec)")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "chunks": total,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }
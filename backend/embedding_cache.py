@@ -0,0 +1,193 @@
+"""
+Content-addressed embedding cache shared by ingestion and the query path.
+
+Vectors are keyed on the model name plus a hash of the text and stored as
+packed float32 blobs in a small SQLite file, with an in-memory LRU in front
+for hot queries. The disk layer is capped by entry count and evicts the
+least recently used vectors.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+EMBED_CACHE_MEMORY_SIZE = int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "2048"))
+
+# SQLite caps bound parameters per statement
+_SQL_BATCH = 500
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) embedding cache"""
+
+    def __init__(self, model_name: str, path: str = EMBED_CACHE_PATH,
+                 max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 memory_size: int = EMBED_CACHE_MEMORY_SIZE):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._db.commit()
+        self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, texts: List[str]) -> Dict[int, List[float]]:
+        """Look up texts; returns {index: vector} for the ones that are cached"""
+        found = {}
+        pending = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = cache_key(self.model_name, text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            keys = list(pending)
+            now = time.time()
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = _unpack(blob)
+                    self._remember(key, vector)
+                    for i in pending.pop(key):
+                        found[i] = vector
+                        self.disk_hits += 1
+                if rows:
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._db.commit()
+            self.misses += sum(len(indexes) for indexes in pending.values())
+        return found
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(self.model_name, text)
+                self._remember(key, list(vector))
+                rows.append((key, _pack(vector), now))
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._disk_entries += max(cursor.rowcount, 0)
+            self._evict()
+            self._db.commit()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self.get_many([text]).get(0)
+
+    def put(self, text: str, vector: List[float]):
+        self.put_many([text], [vector])
+
+    def _remember(self, key: bytes, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        overflow = self._disk_entries - self.max_entries
+        if overflow <= 0:
+            return
+        cursor = self._db.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,)
+        )
+        self._disk_entries -= cursor.rowcount
+        self.evictions += cursor.rowcount
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_entries,
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachedEmbeddings:
+    """LangChain-compatible embeddings wrapper that consults an EmbeddingCache first"""
+
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    @property
+    def client(self):
+        return self.embeddings.client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found = self.cache.get_many(texts)
+        missing = [i for i in range(len(texts)) if i not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], vectors)
+            found.update(zip(missing, vectors))
+        return [found[i] for i in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
@@ -0,0 +1,169 @@
+"""
+Bounded thread pools for the blocking stages of the RAG request path.
+
+Query embedding, Chroma search and Gemini generation are all synchronous
+calls. Running them through these pools keeps the event loop free so health
+checks and other requests are served while a slow generation is in flight.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool sizes per stage. Embedding and search are CPU bound, so they get a
+# small pool; LLM calls are network bound and can fan out much wider.
+POOL_SIZES = {
+    "embed": int(os.getenv("EMBED_POOL_SIZE", "2")),
+    "search": int(os.getenv("SEARCH_POOL_SIZE", "4")),
+    "llm": int(os.getenv("LLM_POOL_SIZE", "32")),
+    "rerank": int(os.getenv("RERANK_POOL_SIZE", "1")),
+}
+
+# Per-stage timeouts in seconds
+STAGE_TIMEOUTS = {
+    "embed": float(os.getenv("EMBED_TIMEOUT", "10")),
+    "search": float(os.getenv("SEARCH_TIMEOUT", "10")),
+    "llm": float(os.getenv("LLM_TIMEOUT", "60")),
+    # The rerank timeout is its latency budget; callers fall back on timeout
+    "rerank": float(os.getenv("RERANK_BUDGET_MS", "150")) / 1000,
+}
+
+_pools = {}
+# Calls submitted and not yet finished, per stage (see run_within_budget)
+_busy = {}
+_busy_lock = threading.Lock()
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage does not finish within its timeout"""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} stage timed out after {timeout:.1f}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class StageBusy(Exception):
+    """Raised instead of queueing when every worker of a budgeted stage is busy"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} stage busy")
+        self.stage = stage
+
+
+def get_pool(stage: str) -> ThreadPoolExecutor:
+    """Return the executor for a stage, creating it on first use"""
+    pool = _pools.get(stage)
+    if pool is None:
+        pool = ThreadPoolExecutor(
+            max_workers=POOL_SIZES[stage],
+            thread_name_prefix=f"{stage}-worker",
+        )
+        _pools[stage] = pool
+    return pool
+
+
+async def run_in_stage(stage: str, func, *args, **kwargs):
+    """
+    Run a blocking call on the stage's pool and await the result.
+
+    The call is abandoned (not interrupted) on timeout: the worker thread
+    finishes in the background and its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_pool(stage), functools.partial(func, *args, **kwargs))
+    timeout = STAGE_TIMEOUTS[stage]
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout)
+
+
+def _release(stage: str):
+    with _busy_lock:
+        _busy[stage] -= 1
+
+
+async def run_within_budget(stage: str, func, *args, **kwargs):
+    """
+    Run a call whose stage timeout is a latency budget with a fallback
+    (rerank). Unlike run_in_stage it never queues: if every worker is still
+    busy, possibly with calls abandoned after their budget ran out,
+    StageBusy is raised at once, so the budget is only spent running the
+    call and the caller falls back without adding to the backlog.
+    """
+    pool = get_pool(stage)
+    with _busy_lock:
+        if _busy.get(stage, 0) >= POOL_SIZES[stage]:
+            raise StageBusy(stage)
+        _busy[stage] = _busy.get(stage, 0) + 1
+    try:
+        job = pool.submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        _release(stage)
+        raise
+    # Fires once the call finishes, or if it is cancelled before it starts
+    job.add_done_callback(lambda _: _release(stage))
+    timeout = STAGE_TIMEOUTS[stage]
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(job), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout)
+
+
+_DONE = object()
+
+
+async def stream_in_stage(stage: str, func, *args, **kwargs):
+    """
+    Consume a blocking iterator on the stage's pool, yielding items as they arrive.
+
+    The stage timeout applies to the gap between items rather than the whole
+    stream, so long answers are fine as long as tokens keep coming.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def publish(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop already closed; nobody is listening any more
+            stop.set()
+
+    def produce():
+        try:
+            for item in func(*args, **kwargs):
+                if stop.is_set():
+                    return
+                publish(item)
+        except Exception as e:
+            publish(_DONE, e)
+        else:
+            publish(_DONE)
+
+    loop.run_in_executor(get_pool(stage), produce)
+    timeout = STAGE_TIMEOUTS[stage]
+    try:
+        while True:
+            try:
+                item, error = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise StageTimeout(stage, timeout)
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def shutdown_pools():
+    """Shut down all stage pools without waiting for queued work"""
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
@@ -0,0 +1,109 @@
+"""
+HTTP plumbing for documentation scraping: pooled sessions, per-host rate
+limiting and an on-disk cache that revalidates with ETag/Last-Modified.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "./.http_cache")
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "8"))
+# Minimum seconds between two requests to the same host
+SCRAPE_HOST_INTERVAL = float(os.getenv("SCRAPE_HOST_INTERVAL", "0.5"))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+def make_session(pool_size: int = SCRAPE_WORKERS) -> requests.Session:
+    """Session whose connection pool is large enough for all fetch workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host by a minimum interval"""
+
+    def __init__(self, min_interval: float = SCRAPE_HOST_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url: str):
+        """Block until the caller may send a request to the URL's host"""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HTTPCache:
+    """
+    On-disk cache of parsed pages keyed by URL.
+
+    Each entry keeps the validators from the last response so the next fetch
+    can be a conditional request; a 304 reuses the stored parsed text.
+    """
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.downloaded = 0
+        self.not_modified = 0
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, response: requests.Response, content: str):
+        entry = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content": content,
+            "fetched_at": time.time(),
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """Request headers that let the server answer 304 Not Modified"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, not_modified: bool):
+        with self._lock:
+            if not_modified:
+                self.not_modified += 1
+            else:
+                self.downloaded += 1
@@ -0,0 +1,54 @@
+"""
+Gunicorn config for multi-worker serving: gunicorn -c gunicorn.conf.py main:app
+
+Each uvicorn worker would otherwise load its own copy of the embedding
+model, BM25 index and reranker. With preload_app the app is imported in the
+master, which loads those read-only objects once (main.preload_shared_state)
+and freezes them out of the garbage collector before forking; the workers
+then share the pages copy-on-write. Chroma clients, SQLite connections, the
+LLM client and thread pools are still opened per worker at startup.
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_SHARED_STATE", "true").lower() == "true"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+if workers > 1:
+    # The in-process session store would be split across workers
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import main
+
+    main.preload_shared_state()
+    # Collections would otherwise write GC headers into the shared pages after fork
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of every worker using all of them
+    threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, multiprocessing.cpu_count() // workers)
+    # The ONNX backend reads this when each worker creates its session (0 = not set)
+    if not int(os.getenv("ONNX_THREADS") or "0"):
+        os.environ["ONNX_THREADS"] = str(threads)
+    # Importing torch would cost an ONNX worker the time and memory that backend saves;
+    # it is only loaded already if the master preloaded a torch model (e.g. the reranker)
+    if os.getenv("EMBEDDING_BACKEND", "torch").lower() == "onnx" and "torch" not in sys.modules:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
@@ -0,0 +1,140 @@
+"""
+Cached metadata about the vector index for / and /stats.
+
+ingest_docs.py writes index_metadata.json next to the Chroma files after
+each sync: chunk counts in total and per service and category, source
+count, embedding model and build time. The server keeps an in-memory
+snapshot of it, plus the index size on disk, and re-reads it on a timer
+only when the file or the Chroma database has changed, so health checks
+and /stats never query Chroma.
+"""
+
+import asyncio
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+INDEX_METADATA_FILENAME = "index_metadata.json"
+INDEX_METADATA_REFRESH_SECONDS = float(os.getenv("INDEX_METADATA_REFRESH_SECONDS", "60"))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def build_index_metadata(collection, embedding_model: str) -> dict:
+    """Count the collection's chunks by service and category (reads every metadata row once)"""
+    metadatas = collection.get(include=["metadatas"])["metadatas"] or []
+    by_service = Counter((m or {}).get("service", "unknown") for m in metadatas)
+    by_category = Counter((m or {}).get("category", "uncategorized") for m in metadatas)
+    return {
+        "documents": len(metadatas),
+        "sources": len({(m or {}).get("source") for m in metadatas} - {None}),
+        "chunks_by_service": dict(by_service.most_common()),
+        "chunks_by_category": dict(by_category.most_common()),
+        "embedding_model": embedding_model,
+        "built_at": _now(),
+    }
+
+
+def save_index_metadata(persist_directory: str, metadata: dict):
+    """Atomically write the metadata next to the Chroma files"""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, INDEX_METADATA_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_index_metadata(persist_directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(persist_directory, INDEX_METADATA_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class IndexMetadataService:
+    """In-memory snapshot of the index metadata, refreshed when the index changes"""
+
+    def __init__(self, persist_directory: str, refresh_seconds: float = INDEX_METADATA_REFRESH_SECONDS):
+        self.persist_directory = persist_directory
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = {}
+        self._version = None
+        self._task = None
+        self.refreshes = 0
+
+    def _current_version(self):
+        return (_mtime(os.path.join(self.persist_directory, INDEX_METADATA_FILENAME)),
+                _mtime(os.path.join(self.persist_directory, "chroma.sqlite3")))
+
+    def refresh(self, collection=None, embedding_model: str = "") -> bool:
+        """Reload the snapshot if the index changed on disk; True if it was reloaded"""
+        version = self._current_version()
+        if version == self._version:
+            return False
+
+        metadata = load_index_metadata(self.persist_directory)
+        if metadata is None and collection is not None:
+            # Index built before ingest wrote the metadata file: count once and save
+            metadata = build_index_metadata(collection, embedding_model)
+            save_index_metadata(self.persist_directory, metadata)
+            version = self._current_version()
+        metadata = dict(metadata or {})
+        metadata["index_bytes"] = directory_size(self.persist_directory)
+        metadata["refreshed_at"] = _now()
+
+        self._snapshot = metadata
+        self._version = version
+        self.refreshes += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return self._snapshot
+
+    @property
+    def documents(self) -> int:
+        return self._snapshot.get("documents", 0)
+
+    def start(self, collection=None, embedding_model: str = ""):
+        self._task = asyncio.create_task(self._run(collection, embedding_model))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, collection, embedding_model: str):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                if await asyncio.to_thread(self.refresh, collection, embedding_model):
+                    print(f"🔄 Index metadata refreshed: {self.documents} documents")
+            except Exception as e:
+                print(f"⚠️  Index metadata refresh failed: {e}")
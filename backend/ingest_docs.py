@@ -4,10 +4,12 @@ Downloads and processes AWS AI/ML documentation into ChromaDB
 """
 
 import os
+import json
+import hashlib
 import requests
 from bs4 import BeautifulSoup
-from typing import List
-import time
+from typing import Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -15,6 +17,16 @@ from langchain_community.vectorstores import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
 
+from embedding import (
+    EMBEDDING_BACKEND, EMBEDDING_MODEL, EmbeddingPipeline, index_documents, load_embeddings, open_embedding_cache
+)
+from sparse_index import SparseIndex, SPARSE_INDEX_FILENAME
+from index_metadata import build_index_metadata, save_index_metadata, INDEX_METADATA_FILENAME
+from fetcher import (
+    HTTPCache, HostRateLimiter, make_session, HTTP_CACHE_DIR, SCRAPE_WORKERS,
+    SCRAPE_HOST_INTERVAL, USER_AGENT
+)
+
 load_dotenv()
 
 # AWS AI/ML Documentation URLs
@@ -531,35 +543,57 @@ def create_sample_documents() -> List[Document]:
     return documents
 
 
-def scrape_aws_docs(url: str, service_name: str) -> Document:
+def parse_aws_doc_html(html: str) -> str:
+    """Extract readable text from an AWS documentation page"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer"]):
+        script.decompose()
+
+    # Get text
+    text = soup.get_text()
+
+    # Clean up text
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = ' '.join(chunk for chunk in chunks if chunk)
+
+    return text[:10000]  # Limit size
+
+
+def scrape_aws_docs(url: str, service_name: str, session: Optional[requests.Session] = None,
+                    cache: Optional[HTTPCache] = None,
+                    rate_limiter: Optional[HostRateLimiter] = None) -> Document:
     """
     Scrape AWS documentation page and create a LangChain document
     Note: This is a basic implementation. For production, consider using
     official AWS documentation APIs or downloading offline docs.
+
+    With a cache, the request is conditional and an unchanged page (304) is
+    served from the cached parsed text without downloading or parsing it.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer"]):
-            script.decompose()
-
-        # Get text
-        text = soup.get_text()
-
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
+        entry = cache.get(url) if cache else None
+        headers = {'User-Agent': USER_AGENT}
+        headers.update(HTTPCache.conditional_headers(entry))
+
+        if rate_limiter:
+            rate_limiter.wait(url)
+        response = (session or requests).get(url, headers=headers, timeout=10)
+
+        if response.status_code == 304 and entry:
+            text = entry["content"]
+            cache.record(not_modified=True)
+        else:
+            response.raise_for_status()
+            text = parse_aws_doc_html(response.text)
+            if cache:
+                cache.put(url, response, text)
+                cache.record(not_modified=False)
 
         return Document(
-            page_content=text[:10000],  # Limit size
+            page_content=text,
             metadata={
                 "source": url,
                 "service": service_name,
@@ -571,36 +605,193 @@ def scrape_aws_docs(url: str, service_name: str) -> Document:
         return None
 
 
-def ingest_documents(use_sample_data: bool = True):
+def scrape_all_docs(urls_by_service: Dict[str, List[str]], max_workers: int = SCRAPE_WORKERS,
+                    cache_dir: str = HTTP_CACHE_DIR, host_interval: float = SCRAPE_HOST_INTERVAL):
     """
-    Main ingestion function
+    Fetch all documentation pages concurrently.
+
+    Returns the documents in input order and the set of URLs that failed.
     """
-    print("🚀 Starting AWS Documentation Ingestion...")
+    jobs = [(url, service) for service, urls in urls_by_service.items() for url in urls]
+    session = make_session(max_workers)
+    cache = HTTPCache(cache_dir)
+    rate_limiter = HostRateLimiter(host_interval)
 
-    # Initialize embeddings - using HuggingFace (local, no API limits!)
-    print("🔧 Loading local embedding model (HuggingFace)...")
-    from langchain_community.embeddings import HuggingFaceEmbeddings
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(
+            lambda job: scrape_aws_docs(job[0], job[1], session, cache, rate_limiter),
+            jobs
+        ))
+    session.close()
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",  # Fast, lightweight model
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    print("✅ Embedding model loaded!")
+    documents = [doc for doc in results if doc]
+    failed = {url for (url, _), doc in zip(jobs, results) if not doc}
+    print(f"🌐 Fetched {len(jobs)} pages: {cache.downloaded} downloaded, "
+          f"{cache.not_modified} unchanged, {len(failed)} failed")
+    return documents, failed
+
+
+COLLECTION_NAME = "aws_docs"
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+
+def content_hash(text: str) -> str:
+    """Stable SHA-256 hex digest of a text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, content: str) -> str:
+    """Deterministic chunk ID built from the source URL and the chunk content"""
+    return f"{content_hash(source)[:16]}-{content_hash(content)[:32]}"
+
+
+def load_manifest(persist_directory: str) -> dict:
+    """Load the record of what is already indexed, or an empty manifest"""
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"embedding_model": EMBEDDING_MODEL, "sources": {}}
+    manifest.setdefault("sources", {})
+    return manifest
+
+
+def save_manifest(persist_directory: str, manifest: dict):
+    """Atomically write the manifest next to the Chroma files"""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def group_chunks_by_source(splits: List[Document]) -> Dict[str, Dict[str, Document]]:
+    """Map each source URL to its chunks keyed by chunk ID (duplicates dropped)"""
+    grouped = {}
+    for split in splits:
+        source = split.metadata.get("source", "")
+        grouped.setdefault(source, {}).setdefault(chunk_id(source, split.page_content), split)
+    return grouped
+
+
+def sync_vector_store(splits: List[Document], persist_directory: str,
+                      keep_sources: Optional[Set[str]] = None,
+                      embedding_backend: str = EMBEDDING_BACKEND) -> dict:
+    """
+    Bring the Chroma collection in line with the given chunks.
+
+    Only chunks whose ID is not yet indexed are embedded; indexed chunks
+    that are no longer part of the corpus are deleted. Sources listed in
+    keep_sources (e.g. pages that failed to download) are left untouched.
+    New chunks are encoded with embedding_backend ("torch" or "onnx").
+
+    The model is embedding.EMBEDDING_MODEL, a constant rather than a
+    setting: changing it in code makes the next run drop the collection and
+    re-embed everything. The BM25 index, index metadata and manifest are
+    only rewritten when something changed, so servers watching their
+    mtimes do not reload for nothing.
+    """
+    keep_sources = keep_sources or set()
+    manifest = load_manifest(persist_directory)
+
+    # Open without an embedding function: diffing IDs needs no model
+    store = Chroma(persist_directory=persist_directory, collection_name=COLLECTION_NAME)
+    if manifest.get("embedding_model") != EMBEDDING_MODEL:
+        # Chunk IDs do not depend on the model, so the old vectors would all
+        # look up to date; drop the collection and embed everything again
+        print(f"⚠️  Index was built with {manifest.get('embedding_model')}, "
+              f"dropping it to re-embed every chunk with {EMBEDDING_MODEL}")
+        store.delete_collection()
+        store = Chroma(persist_directory=persist_directory, collection_name=COLLECTION_NAME)
+        manifest = {"embedding_model": EMBEDDING_MODEL, "sources": {}}
+    known_sources = manifest["sources"]
+    existing_ids = set(store.get(include=[])["ids"])
+
+    grouped = group_chunks_by_source(splits)
+    summary = {"added": 0, "updated": 0, "skipped": 0, "deleted": 0}
+    new_ids, new_docs = [], []
+    wanted_ids = set()
+
+    for source, chunks in grouped.items():
+        for cid, doc in chunks.items():
+            wanted_ids.add(cid)
+            if cid in existing_ids:
+                summary["skipped"] += 1
+                continue
+            summary["updated" if source in known_sources else "added"] += 1
+            new_ids.append(cid)
+            new_docs.append(doc)
+
+    for source in keep_sources:
+        wanted_ids.update(known_sources.get(source, {}).get("chunk_ids", []))
+
+    stale_ids = sorted(existing_ids - wanted_ids)
+    if stale_ids:
+        store.delete(ids=stale_ids)
+        summary["deleted"] = len(stale_ids)
+    changed = bool(new_ids or stale_ids)
+
+    if new_ids:
+        cache = open_embedding_cache()
+        store = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=load_embeddings(cache, backend=embedding_backend),
+            collection_name=COLLECTION_NAME
+        )
+        with EmbeddingPipeline(store.embeddings, cache=cache) as pipeline:
+            throughput = index_documents(store._collection, pipeline, zip(new_ids, new_docs))
+        print(f"⚡ Embedded {throughput['chunks']} chunks at {throughput['chunks_per_sec']} chunks/sec")
+        if cache is not None:
+            print(f"🗃️  Embedding cache: {cache.stats()}")
+
+    # Record what is indexed now
+    sources = {s: known_sources[s] for s in keep_sources if s in known_sources}
+    for source, chunks in grouped.items():
+        sources[source] = {
+            "content_hash": content_hash("".join(d.page_content for d in chunks.values())),
+            "chunk_ids": sorted(chunks),
+        }
+    if sources != known_sources or not os.path.exists(os.path.join(persist_directory, MANIFEST_FILENAME)):
+        manifest["sources"] = sources
+        save_manifest(persist_directory, manifest)
+
+    derived_files = [os.path.join(persist_directory, name)
+                     for name in (SPARSE_INDEX_FILENAME, INDEX_METADATA_FILENAME)]
+    if not changed and all(os.path.exists(path) for path in derived_files):
+        print("✅ Index unchanged; BM25 index and index metadata left as they are")
+        summary["vector_store"] = store
+        return summary
+
+    # Rebuild the keyword index over the whole collection (no embedding needed)
+    sparse_index = SparseIndex.from_collection(store._collection)
+    sparse_index.save(persist_directory)
+    print(f"🔤 BM25 index built over {len(sparse_index)} chunks")
+
+    # Counts and build info served by / and /stats without querying Chroma
+    metadata = build_index_metadata(store._collection, EMBEDDING_MODEL)
+    save_index_metadata(persist_directory, metadata)
+    print(f"🏷️  Index metadata: {metadata['chunks_by_service']}")
+
+    summary["vector_store"] = store
+    return summary
+
+
+def ingest_documents(use_sample_data: bool = True, embedding_backend: str = EMBEDDING_BACKEND):
+    """
+    Main ingestion function
+    """
+    print("🚀 Starting AWS Documentation Ingestion...")
 
     # Get documents
+    failed_sources = set()
     if use_sample_data:
         print("📚 Using sample documentation data (quick start)")
         documents = create_sample_documents()
     else:
-        print("🌐 Scraping AWS documentation (this may take a while)...")
-        documents = []
-        for service, urls in AWS_DOCS_URLS.items():
-            for url in urls:
-                doc = scrape_aws_docs(url, service)
-                if doc:
-                    documents.append(doc)
-                time.sleep(1)  # Be respectful to AWS servers
+        print("🌐 Scraping AWS documentation...")
+        documents, failed_sources = scrape_all_docs(AWS_DOCS_URLS)
 
     print(f"📄 Loaded {len(documents)} documents")
 
@@ -614,27 +805,26 @@ def ingest_documents(use_sample_data: bool = True):
     splits = text_splitter.split_documents(documents)
     print(f"✂️  Split into {len(splits)} chunks")
 
-    # Create vector store
+    # Upsert into the vector store
     persist_directory = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
 
-    print(f"💾 Creating vector store in {persist_directory}...")
+    print(f"💾 Syncing vector store in {persist_directory}...")
 
-    vector_store = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=persist_directory,
-        collection_name="aws_docs"
-    )
+    summary = sync_vector_store(splits, persist_directory, keep_sources=failed_sources,
+                                embedding_backend=embedding_backend)
+    vector_store = summary.pop("vector_store")
 
-    print(f"✅ Successfully ingested {len(splits)} document chunks!")
-    print(f"📊 Vector store created at: {persist_directory}")
+    print(f"✅ Ingestion complete: {summary['added']} added, {summary['updated']} updated, "
+          f"{summary['skipped']} skipped, {summary['deleted']} deleted")
+    print(f"📊 Vector store at: {persist_directory}")
 
-    # Test retrieval
-    print("\n🔍 Testing retrieval...")
-    results = vector_store.similarity_search("What is Amazon SageMaker?", k=2)
-    print(f"Found {len(results)} relevant chunks")
-    if results:
-        print(f"Sample result: {results[0].page_content[:200]}...")
+    if summary["added"] or summary["updated"]:
+        # Test retrieval
+        print("\n🔍 Testing retrieval...")
+        results = vector_store.similarity_search("What is Amazon SageMaker?", k=2)
+        print(f"Found {len(results)} relevant chunks")
+        if results:
+            print(f"Sample result: {results[0].page_content[:200]}...")
 
     return vector_store
 
@@ -644,6 +834,10 @@ if __name__ == "__main__":
 
     # Check if user wants to scrape real docs or use sample data
     use_sample = True
+    backend = EMBEDDING_BACKEND
+    if "--onnx" in sys.argv:
+        sys.argv.remove("--onnx")
+        backend = "onnx"
     if len(sys.argv) > 1:
         if sys.argv[1] == "--scrape":
             use_sample = False
@@ -652,4 +846,4 @@ if __name__ == "__main__":
             use_sample = True
             print("🚀 Quick start mode - using sample data")
 
-    ingest_documents(use_sample_data=use_sample)
+    ingest_documents(use_sample_data=use_sample, embedding_backend=backend)
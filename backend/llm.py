@@ -0,0 +1,208 @@
+"""
+LLM provider interface and implementations.
+
+Every provider offers blocking, async and streaming generation. Gemini is
+the production provider; the stub is a deterministic local stand-in with
+configurable latency and token rate for load tests and benchmarks.
+Select one with LLM_PROVIDER=gemini|stub.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator
+
+from executors import run_in_stage, stream_in_stage
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Stub provider behaviour
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "300"))
+STUB_LLM_TOKENS_PER_SEC = float(os.getenv("STUB_LLM_TOKENS_PER_SEC", "200"))
+STUB_LLM_OUTPUT_TOKENS = int(os.getenv("STUB_LLM_OUTPUT_TOKENS", "150"))
+# Simulated provider quota (requests per minute, 0 = none) and share of calls failing with a 503
+STUB_LLM_RPM = int(os.getenv("STUB_LLM_RPM", "0"))
+STUB_LLM_ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+
+
+class ProviderError(Exception):
+    """An HTTP-style provider failure; code is the status, as on google.api_core errors"""
+
+    def __init__(self, code: int, message: str, retry_after: float = None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+
+class LLMProvider:
+    """Base class: subclasses implement generate() and stream()"""
+
+    name = "base"
+    model_name = ""
+    # Quota the dispatcher paces calls to unless LLM_RPM / LLM_TPM are set (0 = unlimited)
+    default_rpm = 0
+    default_tpm = 0
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str) -> str:
+        """Generate without blocking the event loop (runs on the llm pool)"""
+        return await run_in_stage("llm", self.generate, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream text chunks without blocking the event loop"""
+        async for text in stream_in_stage("llm", self.stream, prompt):
+            yield text
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via google-generativeai"""
+
+    name = "gemini"
+    # gemini-1.5-flash free tier
+    default_rpm = 15
+    default_tpm = 1_000_000
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        import google.generativeai as genai
+
+        # Check for API key
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not found")
+
+        # Configure Gemini - using Flash for higher free tier quota
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. a safety-only update)
+                continue
+            if text:
+                yield text
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic local stand-in for a real LLM.
+
+    Waits latency_ms before the first token, then emits tokens at
+    tokens_per_sec. Quiz prompts get a valid JSON quiz with the requested
+    number of questions; everything else gets filler text derived from a
+    hash of the prompt, so the same prompt always yields the same answer.
+    The async methods sleep on the event loop rather than a thread.
+
+    To exercise rate limiting and retries it can enforce a requests-per-
+    minute quota, answering 429 (with retry_after) once it is used up, and
+    fail a share of calls with a 503, like an overloaded provider.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = STUB_LLM_LATENCY_MS,
+                 tokens_per_sec: float = STUB_LLM_TOKENS_PER_SEC,
+                 output_tokens: int = STUB_LLM_OUTPUT_TOKENS,
+                 quota_rpm: int = STUB_LLM_RPM,
+                 error_rate: float = STUB_LLM_ERROR_RATE):
+        self.latency = latency_ms / 1000
+        self.token_interval = 1 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.output_tokens = output_tokens
+        self.quota_rpm = quota_rpm
+        self.error_rate = error_rate
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self.model_name = f"stub-{latency_ms:g}ms-{tokens_per_sec:g}tps"
+
+    def _admit(self):
+        """Raise the error a throttled or overloaded provider would return"""
+        if self.error_rate and random.random() < self.error_rate:
+            raise ProviderError(503, "Service Unavailable (stub)")
+        if not self.quota_rpm:
+            return
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and now - self._calls[0] >= 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.quota_rpm:
+                raise ProviderError(429, "Resource has been exhausted (stub quota)",
+                                    retry_after=60 - (now - self._calls[0]))
+            self._calls.append(now)
+
+    def _tokens(self, prompt: str):
+        """The full response, pre-split into streaming tokens"""
+        match = re.search(r"with (\d+) multiple choice questions about (.+?) in AWS", prompt)
+        if match:
+            count, topic = int(match.group(1)), match.group(2)
+            questions = [{
+                "question": f"Stub question {i + 1} about {topic}?",
+                "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+                "correct_answer": "ABCD"[i % 4],
+                "explanation": f"Stub explanation {i + 1}",
+            } for i in range(count)]
+            text = json.dumps(questions, indent=2)
+            # Roughly 4 characters per token
+            return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"stub-{seed[i % 60:i % 60 + 4]}" for i in range(self.output_tokens)]
+        return [word + " " for word in words]
+
+    def generate(self, prompt: str) -> str:
+        self._admit()
+        tokens = self._tokens(prompt)
+        time.sleep(self.latency + self.token_interval * len(tokens))
+        return "".join(tokens)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        self._admit()
+        time.sleep(self.latency)
+        for token in self._tokens(prompt):
+            time.sleep(self.token_interval)
+            yield token
+
+    async def agenerate(self, prompt: str) -> str:
+        self._admit()
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.latency + self.token_interval * len(tokens))
+        return "".join(tokens)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        self._admit()
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(prompt):
+            await asyncio.sleep(self.token_interval)
+            yield token
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+}
+
+
+def create_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    """Instantiate the provider selected by name (LLM_PROVIDER by default)"""
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}' (choose from {', '.join(PROVIDERS)})")
+    return provider_class()
@@ -0,0 +1,295 @@
+"""
+Rate limiting, retries and priority queueing for LLM calls.
+
+Every generation goes through one LLMDispatcher per process:
+
+- Two token buckets keep calls under the provider's requests-per-minute
+  and tokens-per-minute quotas (prompt tokens plus an output estimate,
+  corrected once the real output size is known).
+- Calls wait in a priority queue for their turn: interactive /chat first,
+  then on-demand quizzes, then background work (quiz bank refills,
+  conversation summaries). Only the head of the queue waits for budget,
+  so a chat question never queues behind a refill batch.
+- Idle time builds up at most LLM_BURST_SECONDS of allowance, so a burst
+  cannot overrun a rolling one-minute quota.
+- 429 and 5xx errors are retried with full-jitter exponential backoff. A
+  429 also halves the request rate, which then recovers by a twentieth of
+  the limit per successful call, so a quota lower than configured is found
+  quickly; its retry_after hint, if any, pauses the whole queue.
+- When retries run out, or an interactive (chat or quiz) call waited
+  longer than LLM_QUEUE_TIMEOUT, LLMUnavailable tells the endpoint to
+  answer 503 with Retry-After. Background calls have no client waiting on
+  a deadline, so they wait for their turn however long the queue is.
+
+The limits are for the whole server: each of the WEB_CONCURRENCY worker
+processes paces itself to an equal share.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from metrics import LLM_QUEUE_WAIT, LLM_RETRIES
+
+# Empty = the provider's default (Gemini free tier: 15 RPM, 1M TPM; the stub is unlimited); 0 = no limit
+LLM_RPM = os.getenv("LLM_RPM", "")
+LLM_TPM = os.getenv("LLM_TPM", "")
+# Largest burst after an idle period, in seconds of allowance (a full minute would overrun rolling quotas)
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "500"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Longest queue wait for chat and quiz calls (background calls wait as long as needed)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+PRIORITY_CHAT = 0
+PRIORITY_QUIZ = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_QUIZ: "quiz", PRIORITY_BACKGROUND: "background"}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """The provider is throttling or failing and the call could not be completed"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error (google.api_core errors carry it as .code)"""
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def limits_for(provider) -> Tuple[float, float]:
+    """
+    This process's (requests, tokens) per minute: LLM_RPM / LLM_TPM if set,
+    else the provider's defaults, split evenly between the workers
+    """
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    rpm = float(LLM_RPM) if LLM_RPM else getattr(provider, "default_rpm", 0)
+    tpm = float(LLM_TPM) if LLM_TPM else getattr(provider, "default_tpm", 0)
+    return rpm / workers, tpm / workers
+
+
+class TokenBucket:
+    """
+    Allowance of `limit` units per minute, refilled continuously; limit 0 =
+    unlimited. At most burst_seconds of allowance builds up while idle.
+    """
+
+    def __init__(self, limit: float = 0, burst_seconds: float = LLM_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.set_limit(limit)
+
+    def set_limit(self, limit: float):
+        self.limit = limit
+        self.rate = limit
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.rate * self.burst_seconds / 60)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available"""
+        if not self.limit:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing * 60 / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.limit:
+            self._refill()
+            self.level -= amount
+
+    def throttled(self):
+        """The provider said no: halve the rate and drop the saved-up allowance"""
+        if self.limit:
+            self._refill()
+            self.rate = max(self.limit / 10, self.rate / 2)
+            self.level = min(self.level, 0.0)
+
+    def recovered(self):
+        if self.limit and self.rate < self.limit:
+            self._refill()
+            self.rate = min(self.limit, self.rate + self.limit / 20)
+
+
+class LLMDispatcher:
+    """Admission control for LLM calls: priority queue, rate limits and retries"""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 output_estimate: int = LLM_OUTPUT_TOKEN_ESTIMATE):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.output_estimate = output_estimate
+        self._queue = []
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+        # After a 429 with a retry_after hint nothing is sent before this time
+        self._resume_at = 0.0
+        self.dispatched = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def set_limits(self, rpm: float, tpm: float):
+        self.requests.set_limit(rpm)
+        self.tokens.set_limit(tpm)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self, priority: int, tokens: int):
+        """Wait until this call is the highest-priority waiter and the budget allows it"""
+        entry = [priority, next(self._sequence)]
+        heapq.heappush(self._queue, entry)
+        self._notify()
+        start = time.monotonic()
+        deadline = start + self.queue_timeout if priority < PRIORITY_BACKGROUND else None
+        try:
+            while True:
+                changed = self._changed
+                wait = None
+                if self._queue[0] is entry:
+                    wait = max(self.requests.delay(1), self.tokens.delay(tokens),
+                               self._resume_at - time.monotonic())
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.rejected += 1
+                    raise LLMUnavailable(f"LLM queue wait exceeded {self.queue_timeout:g}s",
+                                         retry_after=wait or self.queue_timeout)
+                timeouts = [t for t in (wait, remaining) if t is not None]
+                try:
+                    await asyncio.wait_for(changed.wait(), min(timeouts) if timeouts else None)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            raise
+        finally:
+            # The next waiter may now be at the head
+            self._notify()
+        self.dispatched += 1
+        LLM_QUEUE_WAIT.observe(time.monotonic() - start, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    def concurrency_limit(self, ceiling: int) -> int:
+        """
+        Calls worth having in flight at once for one bulk job: the request
+        bucket's current burst size (ceiling if unlimited). Starting more
+        only lines them up in the queue behind the rate limit.
+        """
+        if not self.requests.limit:
+            return ceiling
+        return max(1, min(ceiling, int(self.requests.capacity)))
+
+    def settle(self, output_tokens: int):
+        """Charge the difference between the real output size and the estimate taken up front"""
+        self.tokens.take(output_tokens - self.output_estimate)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Backoff before the next attempt; None if the error is not retryable"""
+        status = error_status(error)
+        if status not in RETRYABLE_STATUS:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None) or 0
+        if status == 429:
+            self.throttled += 1
+            self.requests.throttled()
+            if retry_after:
+                # The quota is shared: hold every queued call, not just this one
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        if attempt >= self.max_retries:
+            raise LLMUnavailable(f"LLM provider unavailable after {attempt + 1} attempts ({status}): {error}",
+                                 retry_after=max(delay, retry_after)) from error
+        self.retries += 1
+        LLM_RETRIES.inc(status=status)
+        return delay
+
+    async def call(self, func: Callable[[], Awaitable], priority: int, prompt_tokens: int):
+        """Run func() under the limits, retrying throttling and server errors"""
+        for attempt in itertools.count():
+            await self.acquire(priority, prompt_tokens + self.output_estimate)
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.requests.recovered()
+            return result
+
+    async def stream(self, func: Callable[[], AsyncIterator], priority: int,
+                     prompt_tokens: int) -> AsyncIterator:
+        """Like call() for a stream; only retried while nothing has been yielded yet"""
+        for attempt in itertools.count():
+            await self.acquire(priority, prompt_tokens + self.output_estimate)
+            started = False
+            try:
+                async for item in func():
+                    started = True
+                    yield item
+            except Exception as e:
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.requests.recovered()
+            return
+
+    def queue_depth(self) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _ in self._queue:
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            depth[name] = depth.get(name, 0) + 1
+        return depth
+
+    def stats(self) -> dict:
+        return {
+            "rpm_limit": self.requests.limit,
+            "rpm_current": round(self.requests.rate, 2),
+            "tpm_limit": self.tokens.limit,
+            "queued": self.queue_depth(),
+            "dispatched": self.dispatched,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
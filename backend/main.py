@@ -5,18 +5,46 @@ FastAPI server with Google Gemini and ChromaDB
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
 import os
+import json
+import math
+import time
+import asyncio
 from dotenv import load_dotenv
-import google.generativeai as genai
 
-# LangChain/ChromaDB imports
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from embedding import (
+    EMBEDDING_BACKEND, EMBEDDING_MODEL, check_embedding_backend, load_embeddings, open_embedding_cache
+)
+from executors import run_in_stage, run_within_budget, shutdown_pools, StageBusy, StageTimeout
+from llm import create_provider
+from sparse_index import SparseIndex, reciprocal_rank_fusion, HYBRID_CANDIDATES, HYBRID_SPARSE_WEIGHT
+from reranker import Reranker, RERANK_ENABLED, RERANK_CANDIDATES, RERANK_TOP_K
+from context_builder import pack_context, count_tokens
+from answer_cache import AnswerCache, ANSWER_CACHE_ENABLED, normalize_question, index_version
+from quiz_bank import (
+    QuizBank, QuizBankRefiller, acquire_prefill_lock, QUIZ_BANK_ENABLED, QUIZ_BANK_PREFILL_DIFFICULTIES
+)
+from conversation import ConversationMemory, ConversationContext, Turn, QUERY_REWRITE_MODE, HISTORY_SUMMARY_TOKENS
+from session_store import create_session_store
+from index_metadata import IndexMetadataService
+from quiz_parser import QuizStreamParser, parse_questions, unique_questions, QUIZ_MAX_ATTEMPTS
+from single_flight import SingleFlight
+from dense_matrix import DenseMatrix
+from embed_batcher import EmbeddingBatcher, EMBED_BATCH_WINDOW_MS
+from llm_dispatch import (
+    LLMDispatcher, LLMUnavailable, limits_for, PRIORITY_CHAT, PRIORITY_QUIZ, PRIORITY_BACKGROUND
+)
+import metrics
+from metrics import MetricsMiddleware, stage, LLM_CALLS, LLM_CALLS_SAVED, LLM_ERRORS, LLM_TOKENS
 
 load_dotenv()
 
+# Startup timings in /ready are measured from here
+IMPORTED_AT = time.perf_counter()
+
 app = FastAPI(title="AWS AI Learning Platform API")
 
 # CORS middleware - Updated for production
@@ -38,22 +66,98 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Request counts, latency histograms and in-flight gauges for /metrics
+app.add_middleware(MetricsMiddleware)
+
+PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+# /chat/batch: questions per request and LLM generations in flight per batch (at most, see
+# LLMDispatcher.concurrency_limit)
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
 # Global variables
 vector_store = None
-model = None
+llm = None
 embeddings = None
+embedding_model = None  # raw model, set early by preload_shared_state() under gunicorn
+embedding_cache = None
+embed_batcher = None  # groups concurrent query embeddings into one forward pass
+sparse_index = None
+reranker = None
+dense_matrix = None  # all chunk vectors for /chat/batch, loaded on first use
+answer_cache = AnswerCache()
+# Every LLM call waits here for its turn and the provider's rate limits
+llm_dispatcher = LLMDispatcher()
+# Concurrent identical /chat questions share one retrieval and one LLM call
+chat_flights = SingleFlight()
+# Document counts etc. for / and /stats, without querying Chroma per request
+index_metadata = IndexMetadataService(PERSIST_DIRECTORY)
+warm_up_task = None
+# Startup progress reported by /ready: starting -> loading -> warming -> ready (or failed)
+startup_state = {"phase": "starting", "error": None, "listening_seconds": None, "ready_seconds": None}
+quiz_bank = None
+quiz_refiller = None
+session_store = None
+
+TOPICS = {
+    "ai_services": [
+        "Amazon SageMaker",
+        "Amazon Bedrock",
+        "Amazon Comprehend",
+        "Amazon Rekognition",
+        "Amazon Textract",
+        "Amazon Lex",
+        "Amazon Personalize"
+    ],
+    "ml_infrastructure": [
+        "SageMaker Studio",
+        "SageMaker Training",
+        "SageMaker Inference",
+        "SageMaker Feature Store"
+    ],
+    "certifications": [
+        "AWS Certified AI Practitioner",
+        "AWS Certified Machine Learning - Specialty"
+    ]
+}
 
 # Request/Response Models
 class ChatRequest(BaseModel):
     question: str
     conversation_history: Optional[List[dict]] = []
+    # Weight of BM25 vs dense results in hybrid retrieval (None = server default)
+    sparse_weight: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    # Rerank over-fetched candidates with the cross-encoder (None = server default)
+    rerank: Optional[bool] = None
+    # Server-side session from POST /sessions; replaces conversation_history
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
     confidence: Optional[float] = None
+    session_id: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str] = Field(min_length=1, max_length=CHAT_BATCH_MAX_QUESTIONS)
+    sparse_weight: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    rerank: Optional[bool] = None
+    # Stream one NDJSON line per question as it finishes instead of one ordered response
+    stream: bool = False
+
+class ChatBatchItem(BaseModel):
+    index: int
+    question: str
+    answer: Optional[str] = None
+    sources: List[str] = []
+    cached: bool = False
+    error: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
 
 class QuizRequest(BaseModel):
     topic: str
@@ -64,35 +168,48 @@ class QuizResponse(BaseModel):
     questions: List[dict]
 
 
+def preload_shared_state():
+    """
+    Load the read-only models and indexes once in the gunicorn master before
+    it forks, so workers share those pages copy-on-write instead of each
+    loading a copy. Connections, clients and pools are opened per worker in
+    initialize_rag().
+    """
+    global embedding_model, sparse_index, reranker
+
+    # An onnxruntime session is not fork-safe; each worker loads its own (it is small and fast)
+    if EMBEDDING_BACKEND != "onnx":
+        embedding_model = load_embeddings()
+    sparse_index = SparseIndex.load(PERSIST_DIRECTORY)
+    if RERANK_ENABLED:
+        reranker = Reranker()
+    print("✅ Shared models and indexes preloaded")
+
+
 # Initialize RAG system
 def initialize_rag():
     """Initialize the RAG system"""
-    global vector_store, model, embeddings
-
-    # Check for API key
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found")
-
-    # Configure Gemini - using Flash for higher free tier quota
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-
-    # Initialize HuggingFace embeddings (local, no API limits)
-    print("🔧 Loading local embedding model...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    print("✅ Embedding model loaded!")
+    global vector_store, llm, embeddings, embedding_model, embedding_cache, embed_batcher, sparse_index, reranker
 
-    # Initialize ChromaDB
-    persist_directory = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+    # LLM provider (Gemini by default, LLM_PROVIDER=stub for load tests)
+    llm = create_provider()
+    llm_dispatcher.set_limits(*limits_for(llm))
+    print(f"✅ LLM provider: {llm.name} ({llm.model_name}), "
+          f"rate limits (0 = none): {llm_dispatcher.requests.limit:g} RPM, {llm_dispatcher.tokens.limit:g} TPM")
 
+    # Initialize HuggingFace embeddings (local, no API limits), behind the shared cache
+    embedding_cache = open_embedding_cache()
+    if embedding_model is None:
+        embedding_model = load_embeddings()
+    embeddings = load_embeddings(embedding_cache, model=embedding_model)
+    if EMBED_BATCH_WINDOW_MS > 0:
+        embed_batcher = EmbeddingBatcher(embeddings)
+
+    # Initialize ChromaDB (imported here: LangChain and Chroma are slow to import)
+    from langchain_community.vectorstores import Chroma
     try:
         vector_store = Chroma(
-            persist_directory=persist_directory,
+            persist_directory=PERSIST_DIRECTORY,
             embedding_function=embeddings,
             collection_name="aws_docs"
         )
@@ -108,49 +225,113 @@ def initialize_rag():
         print("   Creating empty vector store. Run ingest_docs.py to add documents.")
         vector_store = None
 
+    # Load the BM25 keyword index built by ingest_docs.py
+    if sparse_index is None:
+        sparse_index = SparseIndex.load(PERSIST_DIRECTORY)
+    if sparse_index is not None:
+        print(f"✅ Loaded BM25 index with {len(sparse_index)} chunks")
+    else:
+        print("⚠️  No BM25 index found; using dense retrieval only. Re-run ingest_docs.py to build it.")
+
+    if RERANK_ENABLED and reranker is None:
+        reranker = Reranker()
+
     print("✅ RAG system initialized successfully")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize RAG on startup"""
+    """Start serving right away; load and warm up the RAG system in the background"""
+    global session_store, warm_up_task
+    # A misconfigured embedding backend is a deploy error, not a "not ready yet"
+    check_embedding_backend()
     try:
-        initialize_rag()
+        session_store = create_session_store()
+        if session_store is not None:
+            print(f"✅ Chat sessions: {session_store.name} store")
+    except Exception as e:
+        print(f"⚠️  Chat sessions unavailable: {e}")
+
+    startup_state["listening_seconds"] = round(time.perf_counter() - IMPORTED_AT, 2)
+    warm_up_task = asyncio.create_task(warm_up())
+
+
+async def warm_up():
+    """Initialize RAG off the event loop, then push one dummy query through the pipeline"""
+    startup_state["phase"] = "loading"
+    try:
+        await asyncio.to_thread(initialize_rag)
     except Exception as e:
         print(f"❌ Error initializing RAG: {e}")
+        startup_state.update(phase="failed", error=str(e))
+        return
+
+    if vector_store is not None:
+        await asyncio.to_thread(index_metadata.refresh, vector_store._collection, EMBEDDING_MODEL)
+        index_metadata.start(vector_store._collection, EMBEDDING_MODEL)
+
+    if QUIZ_BANK_ENABLED and llm is not None:
+        start_quiz_bank()
+
+    startup_state["phase"] = "warming"
+    question = "What is Amazon SageMaker?"
+    try:
+        # Loads the tokenizer and runs the first (slowest) model and index calls
+        count_tokens(question)
+        query_embedding = await run_in_stage("embed", embedding_model.embed_query, question)
+        if vector_store is not None:
+            docs = await retrieve_documents(question, query_embedding)
+            if reranker is not None:
+                await rerank_documents(question, docs)
+    except Exception as e:
+        print(f"⚠️  Warm-up query failed: {e}")
+
+    startup_state.update(phase="ready", ready_seconds=round(time.perf_counter() - IMPORTED_AT, 2))
+    print(f"✅ Ready {startup_state['ready_seconds']}s after import "
+          f"(listening after {startup_state['listening_seconds']}s)")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background tasks and release the stage thread pools"""
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await index_metadata.stop()
+    if quiz_refiller is not None:
+        await quiz_refiller.stop()
+    shutdown_pools()
 
 
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Health check endpoint (liveness: answers as soon as the server is listening)"""
     return {
         "status": "online",
         "message": "AWS AI Learning Platform API",
         "rag_initialized": vector_store is not None,
-        "documents_loaded": vector_store._collection.count() if vector_store else 0
+        "documents_loaded": index_metadata.documents if vector_store else 0
     }
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Main chat endpoint for RAG-powered Q&A"""
-    if not vector_store or not model:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
+@app.get("/ready")
+async def ready():
+    """Readiness check: 503 until the RAG system is loaded and warmed up"""
+    is_ready = startup_state["phase"] == "ready" and vector_store is not None and llm is not None
+    return JSONResponse(status_code=200 if is_ready else 503, content={"ready": is_ready, **startup_state})
 
-    try:
-        # Retrieve relevant documents
-        docs = vector_store.similarity_search(request.question, k=3)
 
-        # Build context from retrieved documents
-        context = "\n\n".join([doc.page_content for doc in docs])
+def build_chat_prompt(question: str, docs, history: str = "") -> Tuple[str, list]:
+    """Build the RAG prompt from the retrieved documents within the context token budget"""
+    packed = pack_context(docs)
+    context = packed.text
+    conversation = f"Conversation so far:\n{history}\n\n" if history else ""
 
-        # Build prompt
-        prompt = f"""You are an expert AWS AI/ML instructor helping students prepare for AWS certifications.
+    prompt = f"""You are an expert AWS AI/ML instructor helping students prepare for AWS certifications.
 
 Context from AWS documentation:
 {context}
 
-Question: {request.question}
+{conversation}Question: {question}
 
 Provide a clear, detailed answer that:
 1. Directly answers the question
@@ -161,35 +342,531 @@ Provide a clear, detailed answer that:
 If you don't know the answer based on the context, say so clearly.
 
 Answer:"""
+    print(f"📦 Prompt: {count_tokens(prompt)} tokens "
+          f"({packed.tokens} context tokens from {len(packed.docs)} chunks, {packed.dropped} dropped)")
+    return prompt, packed.docs
 
-        # Generate response using Gemini
-        response = model.generate_content(prompt)
 
-        # Extract sources
-        sources = []
-        for doc in docs:
-            if hasattr(doc, 'metadata') and 'source' in doc.metadata:
-                source = doc.metadata['source']
-                if source not in sources:
-                    sources.append(source)
+def extract_sources(docs) -> List[str]:
+    """Unique source URLs of the retrieved documents, in rank order"""
+    sources = []
+    for doc in docs:
+        if hasattr(doc, 'metadata') and 'source' in doc.metadata:
+            source = doc.metadata['source']
+            if source not in sources:
+                sources.append(source)
+    return sources[:3]
 
-        return ChatResponse(
-            answer=response.text,
-            sources=sources[:3]
+
+async def retrieve_documents(question: str, query_embedding: List[float], k: int = 3,
+                             sparse_weight: Optional[float] = None):
+    """Hybrid retrieval: dense and BM25 candidates fused with reciprocal rank fusion"""
+    if sparse_weight is None:
+        sparse_weight = HYBRID_SPARSE_WEIGHT
+    with stage("search"):
+        if sparse_index is None or sparse_weight <= 0.0:
+            return await run_in_stage("search", vector_store.similarity_search_by_vector, query_embedding, k=k)
+
+        candidates = max(k, HYBRID_CANDIDATES)
+        dense, sparse = await asyncio.gather(
+            run_in_stage("search", vector_store.similarity_search_by_vector, query_embedding, k=candidates),
+            run_in_stage("search", sparse_index.search, question, candidates),
         )
+        return reciprocal_rank_fusion(dense, [doc for doc, _ in sparse], k, sparse_weight)
+
+
+async def rerank_documents(question: str, docs, top_k: int = RERANK_TOP_K):
+    """Cross-encoder rerank within the latency budget; falls back to retrieval order"""
+    if len(docs) <= 1:
+        return docs[:top_k]
+    try:
+        with stage("rerank"):
+            scores = await run_within_budget("rerank", reranker.score, question, docs)
+    except StageBusy:
+        reranker.busy_fallbacks += 1
+        return docs[:top_k]
+    except StageTimeout:
+        reranker.fallbacks += 1
+        return docs[:top_k]
+    reranker.reranked += 1
+    return Reranker.order(docs, scores, top_k)
+
+
+async def retrieve_for_request(request: ChatRequest, query: str, query_embedding: List[float]):
+    """Retrieve the chunks for a chat request's standalone query, reranking if requested"""
+    use_rerank = RERANK_ENABLED if request.rerank is None else request.rerank
+    if use_rerank and reranker is not None:
+        candidates = await retrieve_documents(query, query_embedding, k=RERANK_CANDIDATES,
+                                              sparse_weight=request.sparse_weight)
+        return await rerank_documents(query, candidates)
+    return await retrieve_documents(query, query_embedding, sparse_weight=request.sparse_weight)
+
+
+async def embed_question(question: str) -> List[float]:
+    """Query embedding on the embed pool, micro-batched with concurrent requests"""
+    with stage("embed"):
+        if embed_batcher is not None:
+            return await embed_batcher.embed_query(question)
+        return await run_in_stage("embed", embeddings.embed_query, question)
+
+
+async def generate_answer(prompt: str, priority: int = PRIORITY_CHAT) -> str:
+    """LLM generation (queued, rate limited and retried) with token and error accounting"""
+    endpoint = metrics.current_endpoint()
+    prompt_tokens = count_tokens(prompt)
+    LLM_TOKENS.inc(prompt_tokens, endpoint=endpoint, direction="input")
+    try:
+        with stage("llm"):
+            text = await llm_dispatcher.call(lambda: llm.agenerate(prompt), priority, prompt_tokens)
+    except Exception as e:
+        LLM_CALLS.inc(endpoint=endpoint, outcome="error")
+        LLM_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+        raise
+    output_tokens = count_tokens(text)
+    llm_dispatcher.settle(output_tokens)
+    LLM_CALLS.inc(endpoint=endpoint, outcome="ok")
+    LLM_TOKENS.inc(output_tokens, endpoint=endpoint, direction="output")
+    return text
+
+
+async def stream_answer(prompt: str, priority: int = PRIORITY_CHAT):
+    """Streaming LLM generation (queued, rate limited and retried) with token and error accounting"""
+    endpoint = metrics.current_endpoint()
+    prompt_tokens = count_tokens(prompt)
+    LLM_TOKENS.inc(prompt_tokens, endpoint=endpoint, direction="input")
+    parts = []
+    try:
+        with stage("llm"):
+            async for text in llm_dispatcher.stream(lambda: llm.astream(prompt), priority, prompt_tokens):
+                parts.append(text)
+                yield text
+    except Exception as e:
+        LLM_CALLS.inc(endpoint=endpoint, outcome="error")
+        LLM_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+        raise
+    output_tokens = count_tokens("".join(parts))
+    llm_dispatcher.settle(output_tokens)
+    LLM_CALLS.inc(endpoint=endpoint, outcome="ok")
+    LLM_TOKENS.inc(output_tokens, endpoint=endpoint, direction="output")
+
+
+async def summarize_conversation(summary: str, turns: str) -> str:
+    """Fold rolled-off turns into the running conversation summary"""
+    prompt = f"""Update the running summary of a tutoring conversation about AWS AI/ML services.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{turns}
+
+Write the updated summary in at most {HISTORY_SUMMARY_TOKENS * 3 // 4} words. Keep the AWS services, concepts and open questions the student asked about.
+
+Summary:"""
+    return await generate_answer(prompt, PRIORITY_BACKGROUND)
+
+
+async def rewrite_follow_up(question: str, history: str) -> str:
+    """Rewrite a follow-up question into a standalone search query"""
+    prompt = f"""Rewrite the student's follow-up question as a standalone question that can be understood without the conversation. Name the AWS services it refers to. Return only the rewritten question.
+
+Conversation:
+{history}
+
+Follow-up question: {question}
+
+Standalone question:"""
+    return await generate_answer(prompt)
+
+
+conversation_memory = ConversationMemory(
+    summarize_conversation,
+    rewrite=rewrite_follow_up if QUERY_REWRITE_MODE == "llm" else None
+)
+
+
+def load_history(request: ChatRequest):
+    """The request's history: the stored session if it names one, else conversation_history"""
+    if request.session_id is None:
+        return request.conversation_history
+    require_sessions()
+    turns = session_store.get(request.session_id)
+    if turns is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return turns
+
+
+def record_turns(request: ChatRequest, answer: str):
+    """Append the exchange to the request's session, if it has one"""
+    if request.session_id is not None and session_store is not None:
+        session_store.append(request.session_id, [Turn("user", request.question), Turn("assistant", answer)])
+
+
+async def prepare_conversation(request: ChatRequest, history) -> ConversationContext:
+    """Standalone retrieval query and bounded history section for a chat request"""
+    with stage("history"):
+        return await conversation_memory.prepare(request.question, history)
+
+
+def answer_cache_applies(request: ChatRequest, conversation: ConversationContext) -> bool:
+    """
+    Cached answers are only reused (and stored) for requests with default
+    retrieval settings and no conversation history: the prompt of any
+    request with history or a summary includes it, so its answer is not
+    one other users may be served under the bare question
+    """
+    return (ANSWER_CACHE_ENABLED and request.sparse_weight is None and request.rerank is None
+            and not conversation.follow_up and not conversation.history)
+
+
+def lookup_cached_answer(cache_key: str, use_cache: bool):
+    """Exact-match answer cache lookup (also handles index invalidation)"""
+    if not use_cache:
+        return None
+    answer_cache.check_version(index_version(PERSIST_DIRECTORY))
+    return answer_cache.get_exact(cache_key)
 
+
+def llm_unavailable(error: LLMUnavailable) -> HTTPException:
+    """503 telling the client when the LLM quota should allow another try"""
+    return HTTPException(status_code=503, detail=f"Error: {str(error)}",
+                         headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))})
+
+
+def flight_key(request: ChatRequest, conversation: ConversationContext, cache_key: str) -> tuple:
+    """Identical in-flight questions share work only if they retrieve and prompt the same way"""
+    sparse_weight = HYBRID_SPARSE_WEIGHT if request.sparse_weight is None else request.sparse_weight
+    use_rerank = (RERANK_ENABLED if request.rerank is None else request.rerank) and reranker is not None
+    return (cache_key, normalize_question(conversation.query), conversation.history, sparse_weight, use_rerank)
+
+
+async def generate_chat_response(request: ChatRequest, conversation: ConversationContext,
+                                 cache_key: str, use_cache: bool) -> Tuple[ChatResponse, bool]:
+    """Embedding, semantic cache, retrieval, prompt and LLM; returns (response, generated)"""
+    # Retrieve relevant documents (embedding and search run off the event loop)
+    query_embedding = await embed_question(conversation.query)
+
+    if use_cache:
+        cached = answer_cache.get_similar(query_embedding)
+        if cached is not None:
+            return cached, False
+
+    docs = await retrieve_for_request(request, conversation.query, query_embedding)
+    with stage("prompt"):
+        prompt, used_docs = build_chat_prompt(request.question, docs, conversation.history)
+
+    # Generate response using the LLM provider
+    answer = await generate_answer(prompt)
+
+    result = ChatResponse(
+        answer=answer,
+        sources=extract_sources(used_docs)
+    )
+    if use_cache:
+        answer_cache.put(cache_key, query_embedding, result)
+    return result, True
+
+
+async def answer_chat(request: ChatRequest, history) -> ChatResponse:
+    """Answer a chat question: answer cache, retrieval, prompt, LLM"""
+    conversation = await prepare_conversation(request, history)
+
+    # Serve repeated questions from the answer cache
+    cache_key = normalize_question(request.question)
+    use_cache = answer_cache_applies(request, conversation)
+    cached = lookup_cached_answer(cache_key, use_cache)
+    if cached is not None:
+        return cached
+
+    # Identical questions already being answered wait for that answer instead of generating again
+    (result, generated), shared = await chat_flights.do(
+        flight_key(request, conversation, cache_key),
+        lambda: generate_chat_response(request, conversation, cache_key, use_cache)
+    )
+    if shared and generated:
+        LLM_CALLS_SAVED.inc(endpoint=metrics.current_endpoint())
+    return result
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """Main chat endpoint for RAG-powered Q&A"""
+    if not vector_store or not llm:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+
+    history = load_history(request)
+    try:
+        result = await answer_chat(request, history)
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Error: {str(e)}")
+    except LLMUnavailable as e:
+        raise llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+    if request.session_id is not None:
+        record_turns(request, result.answer)
+        # Cached responses are shared, so tag a copy
+        result = result.model_copy(update={"session_id": request.session_id})
+    return result
 
-@app.post("/quiz", response_model=QuizResponse)
-async def generate_quiz(request: QuizRequest):
-    """Generate a quiz on a specific AWS AI/ML topic"""
-    if not model:
-        raise HTTPException(status_code=503, detail="LLM not initialized")
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def generate_chat_events(request: ChatRequest, conversation: ConversationContext,
+                               cache_key: str, use_cache: bool):
+    """Shared part of a streamed answer: ("sources", [...]), ("token", text)..., ("generated", bool)"""
+    query_embedding = await embed_question(conversation.query)
+    cached = answer_cache.get_similar(query_embedding) if use_cache else None
+    if cached is not None:
+        yield "sources", cached.sources
+        yield "token", cached.answer
+        yield "generated", False
+        return
+
+    docs = await retrieve_for_request(request, conversation.query, query_embedding)
+    with stage("prompt"):
+        prompt, used_docs = build_chat_prompt(request.question, docs, conversation.history)
+    sources = extract_sources(used_docs)
+    yield "sources", sources
+
+    parts = []
+    async for text in stream_answer(prompt):
+        parts.append(text)
+        yield "token", text
+
+    if use_cache:
+        answer_cache.put(cache_key, query_embedding, ChatResponse(answer="".join(parts), sources=sources))
+    yield "generated", True
+
+
+async def _chat_event_stream(request: ChatRequest, history):
+    """Event stream for /chat/stream: sources, then tokens, then timings"""
+    start = time.perf_counter()
+    timings = {}
     try:
-        quiz_prompt = f"""Generate a {request.difficulty} difficulty quiz with {request.num_questions} multiple choice questions about {request.topic} in AWS.
+        conversation = await prepare_conversation(request, history)
+        cache_key = normalize_question(request.question)
+        use_cache = answer_cache_applies(request, conversation)
+        cached = lookup_cached_answer(cache_key, use_cache)
+
+        if cached is not None:
+            yield _sse("sources", {"sources": cached.sources})
+            yield _sse("token", {"text": cached.answer})
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            record_turns(request, cached.answer)
+            yield _sse("done", {"cached": True, "timings": timings, "session_id": request.session_id})
+            return
+
+        # Subscribers to an identical in-flight answer replay its tokens so far, then follow it live
+        events, shared = chat_flights.stream(
+            flight_key(request, conversation, cache_key),
+            lambda: generate_chat_events(request, conversation, cache_key, use_cache)
+        )
+        parts = []
+        generated = False
+        async for event, data in events:
+            if event == "sources":
+                timings["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                yield _sse("sources", {"sources": data})
+            elif event == "token":
+                if not parts:
+                    timings["time_to_first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                parts.append(data)
+                yield _sse("token", {"text": data})
+            else:
+                generated = data
+
+        if shared and generated:
+            LLM_CALLS_SAVED.inc(endpoint=metrics.current_endpoint())
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record_turns(request, "".join(parts))
+        yield _sse("done", {"cached": not generated, "coalesced": shared,
+                            "timings": timings, "session_id": request.session_id})
+
+    except LLMUnavailable as e:
+        yield _sse("error", {"detail": f"Error: {str(e)}", "retry_after": math.ceil(e.retry_after)})
+    except Exception as e:
+        # Headers are already sent, so errors travel as an event
+        yield _sse("error", {"detail": f"Error: {str(e)}"})
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Streaming variant of /chat using Server-Sent Events"""
+    if not vector_store or not llm:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+
+    history = load_history(request)
+    return StreamingResponse(
+        _chat_event_stream(request, history),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def load_dense_matrix() -> DenseMatrix:
+    """The collection's vectors as one matrix, reloaded when the index changes"""
+    global dense_matrix
+    version = index_version(PERSIST_DIRECTORY)
+    if dense_matrix is None or dense_matrix.version != version:
+        dense_matrix = DenseMatrix.from_collection(vector_store._collection, version)
+        print(f"✅ Loaded {len(dense_matrix)} chunk vectors for batch retrieval")
+    return dense_matrix
+
+
+def search_batch(questions: List[str], vectors, k: int, sparse_weight: float) -> List[list]:
+    """Dense top-k for all questions in one matrix product, fused with BM25 per question"""
+    matrix = load_dense_matrix()
+    if sparse_index is None or sparse_weight <= 0.0:
+        return matrix.search(vectors, k)
+    candidates = max(k, HYBRID_CANDIDATES)
+    return [
+        reciprocal_rank_fusion(dense, [doc for doc, _ in sparse_index.search(question, candidates)],
+                               k, sparse_weight)
+        for question, dense in zip(questions, matrix.search(vectors, candidates))
+    ]
+
+
+async def answer_batch(request: ChatBatchRequest):
+    """Yield (index, ChatBatchItem) for each question of a batch as soon as it is answered"""
+    questions = request.questions
+    sparse_weight = HYBRID_SPARSE_WEIGHT if request.sparse_weight is None else request.sparse_weight
+    use_rerank = (RERANK_ENABLED if request.rerank is None else request.rerank) and reranker is not None
+    use_cache = ANSWER_CACHE_ENABLED and request.sparse_weight is None and request.rerank is None
+
+    pending = []
+    for index, question in enumerate(questions):
+        cached = lookup_cached_answer(normalize_question(question), use_cache)
+        if cached is not None:
+            yield index, ChatBatchItem(index=index, question=question, answer=cached.answer,
+                                       sources=cached.sources, cached=True)
+        else:
+            pending.append(index)
+    if not pending:
+        return
+
+    # One batched forward pass for every question still to answer
+    with stage("embed"):
+        vectors = await run_in_stage("embed", embeddings.embed_documents, [questions[i] for i in pending])
+    vector_of = dict(zip(pending, vectors))
+    if use_cache:
+        for index in list(pending):
+            cached = answer_cache.get_similar(vector_of[index])
+            if cached is not None:
+                pending.remove(index)
+                yield index, ChatBatchItem(index=index, question=questions[index], answer=cached.answer,
+                                           sources=cached.sources, cached=True)
+        if not pending:
+            return
+
+    # One matrix product for all nearest-neighbour lookups
+    with stage("search"):
+        docs_of = dict(zip(pending, await run_in_stage(
+            "search", search_batch, [questions[i] for i in pending], [vector_of[i] for i in pending],
+            RERANK_CANDIDATES if use_rerank else 3, sparse_weight
+        )))
+    if use_rerank:
+        for index in pending:
+            docs_of[index] = await rerank_documents(questions[index], docs_of[index])
+
+    # No more generations in flight than the LLM rate limit lets start at once
+    semaphore = asyncio.Semaphore(llm_dispatcher.concurrency_limit(CHAT_BATCH_CONCURRENCY))
+
+    async def answer_one(index: int):
+        question = questions[index]
+        try:
+            async with semaphore:
+                with stage("prompt"):
+                    prompt, used_docs = build_chat_prompt(question, docs_of[index])
+                answer = await generate_answer(prompt, PRIORITY_BACKGROUND)
+        except Exception as e:
+            return index, ChatBatchItem(index=index, question=question, error=f"Error: {str(e)}")
+        result = ChatResponse(answer=answer, sources=extract_sources(used_docs))
+        if use_cache:
+            answer_cache.put(normalize_question(question), vector_of[index], result)
+        return index, ChatBatchItem(index=index, question=question, answer=answer, sources=result.sources)
+
+    tasks = [asyncio.ensure_future(answer_one(index)) for index in pending]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # A streaming client that disconnects should not leave generations running
+        for task in tasks:
+            task.cancel()
+
+
+async def _chat_batch_lines(request: ChatBatchRequest):
+    """NDJSON body for a streamed /chat/batch: one line per question in completion order"""
+    try:
+        async for _, item in answer_batch(request):
+            yield item.model_dump_json() + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Error: {str(e)}"}) + "\n"
+
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest):
+    """
+    Answer many standalone questions at once: one batched embedding pass, one
+    matrix nearest-neighbour search, and LLM calls with bounded concurrency.
+    Results come back in question order, or as NDJSON as they finish.
+    """
+    if not vector_store or not llm:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+
+    if request.stream:
+        return StreamingResponse(_chat_batch_lines(request), media_type="application/x-ndjson",
+                                 headers={"X-Accel-Buffering": "no"})
+    results = [None] * len(request.questions)
+    try:
+        async for index, item in answer_batch(request):
+            results[index] = item
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return ChatBatchResponse(results=results)
+
+
+def require_sessions():
+    if session_store is None:
+        raise HTTPException(status_code=400, detail="Sessions are disabled (SESSION_BACKEND=off)")
+
+
+@app.post("/sessions")
+async def create_session():
+    """Start a server-side chat session; send its session_id with /chat instead of the history"""
+    require_sessions()
+    return {"session_id": session_store.create(), "ttl_seconds": session_store.ttl}
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Turns stored in a session (e.g. to restore the chat after a page reload)"""
+    require_sessions()
+    turns = session_store.get(session_id)
+    if turns is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"session_id": session_id, "turns": [turn._asdict() for turn in turns]}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """End a session and drop its turns"""
+    require_sessions()
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+
+def build_quiz_prompt(topic: str, difficulty: str, num_questions: int) -> str:
+    """Prompt asking the LLM for a multiple choice quiz as a JSON array"""
+    return f"""Generate a {difficulty} difficulty quiz with {num_questions} multiple choice questions about {topic} in AWS.
 
 Focus on topics relevant to AWS AI Practitioner and Machine Learning certifications.
 
@@ -205,56 +882,170 @@ Format the response as a JSON array with this exact structure:
 
 Make questions practical and exam-relevant. Return ONLY the JSON array, no other text."""
 
-        response = model.generate_content(quiz_prompt)
 
-        # Parse response
-        import json
-        import re
+def fallback_quiz_questions(topic: str) -> List[dict]:
+    """Placeholder quiz for when the model produced no usable questions"""
+    return [{
+        "question": f"What is the primary use case for {topic}?",
+        "options": ["A) Data storage", "B) Machine learning", "C) Networking", "D) Security"],
+        "correct_answer": "B",
+        "explanation": "Please try again - quiz generation needs refinement"
+    }]
 
-        # Extract JSON from response
-        json_match = re.search(r'\[.*\]', response.text, re.DOTALL)
-        if json_match:
-            questions = json.loads(json_match.group())
-        else:
-            # Fallback
-            questions = [{
-                "question": f"What is the primary use case for {request.topic}?",
-                "options": ["A) Data storage", "B) Machine learning", "C) Networking", "D) Security"],
-                "correct_answer": "B",
-                "explanation": "Please try again - quiz generation needs refinement"
-            }]
 
-        return QuizResponse(questions=questions)
+def parse_quiz_questions(response_text: str, topic: str) -> List[dict]:
+    """Extract the valid questions from a complete model response"""
+    return parse_questions(response_text) or fallback_quiz_questions(topic)
+
+
+async def stream_quiz_questions(topic: str, difficulty: str, num_questions: int):
+    """
+    Yield validated, distinct questions as the model streams them, then
+    re-request only the shortfall if some items were malformed or missing
+    """
+    seen = set()
+    produced = 0
+    for _ in range(QUIZ_MAX_ATTEMPTS):
+        missing = num_questions - produced
+        if missing <= 0:
+            return
+        with stage("prompt"):
+            quiz_prompt = build_quiz_prompt(topic, difficulty, missing)
+        parser = QuizStreamParser()
+        async for text in stream_answer(quiz_prompt, PRIORITY_QUIZ):
+            for question in unique_questions(parser.feed(text), seen):
+                if produced < num_questions:
+                    produced += 1
+                    yield question
+        if parser.invalid:
+            print(f"⚠️  Dropped {parser.invalid} malformed quiz question(s) for {topic}")
+
+
+async def generate_quiz_batch(topic: str, difficulty: str, num_questions: int) -> List[dict]:
+    """One LLM call producing questions for the quiz bank (no fallback question)"""
+    response_text = await generate_answer(build_quiz_prompt(topic, difficulty, num_questions), PRIORITY_BACKGROUND)
+    return parse_questions(response_text)
+
+
+def start_quiz_bank():
+    """Open the quiz bank and queue refills for the /topics pools that are low"""
+    global quiz_bank, quiz_refiller
+    try:
+        quiz_bank = QuizBank()
+    except Exception as e:
+        print(f"⚠️  Quiz bank unavailable ({e}); quizzes will be generated on demand")
+        return
+    quiz_refiller = QuizBankRefiller(quiz_bank, generate_quiz_batch,
+                                     topics=[topic for topics in TOPICS.values() for topic in topics])
+    quiz_refiller.start()
+
+    if not QUIZ_BANK_PREFILL_DIFFICULTIES:
+        print(f"✅ Quiz bank: {quiz_bank.stats()['available']} questions available (prefill off)")
+        return
+    # With several workers, only one prefills; the rest just refill pools they drain
+    if not acquire_prefill_lock(quiz_bank.path):
+        print("✅ Quiz bank: opened (another worker is prefilling)")
+        return
+    queued = 0
+    for topics in TOPICS.values():
+        for topic in topics:
+            for difficulty in QUIZ_BANK_PREFILL_DIFFICULTIES:
+                if quiz_refiller.covers(topic, difficulty) and quiz_bank.needs_refill(topic, difficulty):
+                    quiz_refiller.request(topic, difficulty)
+                    queued += 1
+    print(f"✅ Quiz bank: {quiz_bank.stats()['available']} questions available, {queued} pools queued for refill")
+
+
+def take_from_quiz_bank(request: QuizRequest) -> List[dict]:
+    """Questions from the precomputed pool ([] if short); tops the pool up in the background"""
+    if quiz_bank is None or not quiz_refiller.covers(request.topic, request.difficulty):
+        return []
+    with stage("bank"):
+        questions = quiz_bank.take(request.topic, request.difficulty, request.num_questions)
+        if quiz_bank.needs_refill(request.topic, request.difficulty):
+            quiz_refiller.request(request.topic, request.difficulty)
+    return questions
+
+
+def keep_in_quiz_bank(request: QuizRequest, questions: List[dict]):
+    """Store on-demand questions for banked pools in the bank too (already served once)"""
+    if quiz_bank is not None and questions and quiz_refiller.covers(request.topic, request.difficulty):
+        quiz_bank.add(request.topic, request.difficulty, questions, served=1)
+
+
+@app.post("/quiz", response_model=QuizResponse)
+async def generate_quiz(request: QuizRequest):
+    """Generate a quiz on a specific AWS AI/ML topic"""
+    if not llm:
+        raise HTTPException(status_code=503, detail="LLM not initialized")
+
+    try:
+        questions = take_from_quiz_bank(request)
+        if questions:
+            return QuizResponse(questions=questions)
+
+        questions = [question async for question in
+                     stream_quiz_questions(request.topic, request.difficulty, request.num_questions)]
+        keep_in_quiz_bank(request, questions)
+        return QuizResponse(questions=questions or fallback_quiz_questions(request.topic))
 
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Error: {str(e)}")
+    except LLMUnavailable as e:
+        raise llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+async def _quiz_event_stream(request: QuizRequest):
+    """Event stream for /quiz/stream: one event per question as soon as it is parsed"""
+    start = time.perf_counter()
+    timings = {}
+    try:
+        questions = take_from_quiz_bank(request)
+        source = "bank" if questions else "llm"
+        if questions:
+            for question in questions:
+                yield _sse("question", question)
+        else:
+            async for question in stream_quiz_questions(request.topic, request.difficulty,
+                                                        request.num_questions):
+                if not questions:
+                    timings["time_to_first_question_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                questions.append(question)
+                yield _sse("question", question)
+            keep_in_quiz_bank(request, questions)
+            if not questions:
+                source = "fallback"
+                for question in fallback_quiz_questions(request.topic):
+                    yield _sse("question", question)
+
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        yield _sse("done", {"source": source, "count": len(questions), "timings": timings})
+
+    except LLMUnavailable as e:
+        yield _sse("error", {"detail": f"Error: {str(e)}", "retry_after": math.ceil(e.retry_after)})
+    except Exception as e:
+        yield _sse("error", {"detail": f"Error: {str(e)}"})
+
+
+@app.post("/quiz/stream")
+async def quiz_stream(request: QuizRequest):
+    """Streaming variant of /quiz: questions arrive as Server-Sent Events while the model writes"""
+    if not llm:
+        raise HTTPException(status_code=503, detail="LLM not initialized")
+
+    return StreamingResponse(
+        _quiz_event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/topics")
 async def get_topics():
     """Get available AWS AI/ML topics"""
-    topics = {
-        "ai_services": [
-            "Amazon SageMaker",
-            "Amazon Bedrock",
-            "Amazon Comprehend",
-            "Amazon Rekognition",
-            "Amazon Textract",
-            "Amazon Lex",
-            "Amazon Personalize"
-        ],
-        "ml_infrastructure": [
-            "SageMaker Studio",
-            "SageMaker Training",
-            "SageMaker Inference",
-            "SageMaker Feature Store"
-        ],
-        "certifications": [
-            "AWS Certified AI Practitioner",
-            "AWS Certified Machine Learning - Specialty"
-        ]
-    }
-    return topics
+    return TOPICS
 
 
 @app.get("/stats")
@@ -264,17 +1055,100 @@ async def get_stats():
         return {"error": "Vector store not initialized"}
 
     try:
-        count = vector_store._collection.count()
+        count = index_metadata.documents
         return {
             "total_documents": count,
             "status": "healthy" if count > 0 else "needs_documents",
-            "embedding_model": "all-MiniLM-L6-v2",
-            "llm_model": "gemini-1.5-flash"
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "index": index_metadata.snapshot(),
+            "llm_provider": llm.name if llm else None,
+            "llm_model": llm.model_name if llm else None,
+            "answer_cache": answer_cache.stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "embedding_batches": embed_batcher.stats() if embed_batcher else None,
+            "reranker": reranker.stats() if reranker else None,
+            "quiz_bank": {**quiz_bank.stats(), **quiz_refiller.stats()} if quiz_bank else None,
+            "conversation": conversation_memory.stats(),
+            "sessions": session_store.stats() if session_store else None,
+            "coalescing": {**chat_flights.stats(), "llm_calls_saved": int(LLM_CALLS_SAVED.total())},
+            "llm_dispatch": llm_dispatcher.stats()
         }
     except Exception as e:
         return {"error": str(e)}
 
 
+def _collect_cache_metrics():
+    """Scrape-time samples for the caches and the reranker"""
+    lookups = []
+    sizes = []
+    cache = answer_cache.stats()
+    lookups += [({"cache": "answer", "result": "exact_hit"}, cache["exact_hits"]),
+                ({"cache": "answer", "result": "semantic_hit"}, cache["semantic_hits"]),
+                ({"cache": "answer", "result": "miss"}, cache["misses"])]
+    sizes.append(({"cache": "answer"}, cache["size"]))
+    if embedding_cache is not None:
+        cache = embedding_cache.stats()
+        lookups += [({"cache": "embedding", "result": "memory_hit"}, cache["memory_hits"]),
+                    ({"cache": "embedding", "result": "disk_hit"}, cache["disk_hits"]),
+                    ({"cache": "embedding", "result": "miss"}, cache["misses"])]
+        sizes.append(({"cache": "embedding"}, cache["disk_entries"]))
+    families = [
+        ("rag_cache_lookups_total", "counter", "Cache lookups by cache and result", lookups),
+        ("rag_cache_entries", "gauge", "Entries held by each cache", sizes),
+    ]
+    if embed_batcher is not None:
+        batches = embed_batcher.stats()
+        families += [
+            ("rag_embed_batches_total", "counter", "Micro-batched query embedding passes",
+             [({}, batches["batches"])]),
+            ("rag_embed_batched_queries_total", "counter", "Query embeddings served by micro-batches",
+             [({}, batches["queries"])]),
+        ]
+    if reranker is not None:
+        families.append(("rag_rerank_fallbacks_total", "counter",
+                         "Reranks skipped for the retrieval order, by reason",
+                         [({"reason": "budget"}, reranker.fallbacks), ({"reason": "busy"}, reranker.busy_fallbacks)]))
+    if quiz_bank is not None:
+        bank = quiz_bank.stats()
+        families += [
+            ("rag_quiz_bank_questions", "gauge", "Unretired questions in the quiz bank",
+             [({}, bank["available"])]),
+            ("rag_quiz_bank_requests_total", "counter", "Quiz requests by where the questions came from",
+             [({"source": "bank"}, bank["served_from_bank"]), ({"source": "llm"}, bank["bank_misses"])]),
+        ]
+    dispatch = llm_dispatcher.stats()
+    flights = chat_flights.stats()
+    families += [
+        ("rag_llm_queue_depth", "gauge", "LLM calls waiting for their turn, by priority",
+         [({"priority": priority}, depth) for priority, depth in dispatch["queued"].items()]),
+        ("rag_llm_rate_limit_rpm", "gauge", "Requests per minute the LLM dispatcher currently allows",
+         [({}, dispatch["rpm_current"])]),
+        ("rag_coalesced_requests_total", "counter", "Chat requests that joined an identical in-flight request",
+         [({}, flights["coalesced"])]),
+        ("rag_coalescing_in_flight", "gauge", "Distinct chat questions currently being answered",
+         [({}, flights["in_flight"])]),
+    ]
+    index = index_metadata.snapshot()
+    if index:
+        families += [
+            ("rag_index_chunks", "gauge", "Indexed chunks per AWS service",
+             [({"service": service}, count) for service, count in index.get("chunks_by_service", {}).items()]),
+            ("rag_index_size_bytes", "gauge", "Size of the Chroma directory on disk",
+             [({}, index.get("index_bytes", 0))]),
+        ]
+    return families
+
+
+metrics.register_collector(_collect_cache_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, in-flight requests, caches, LLM usage"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,238 @@
+"""
+Request and pipeline-stage metrics in Prometheus text format.
+
+A small self-contained implementation (counters, gauges, histograms and
+scrape-time collectors) so the backend needs no extra dependency. Stage
+spans are recorded with `with stage("embed"):` anywhere inside a request;
+the ASGI middleware supplies the endpoint label and can echo the per-stage
+breakdown of a single request in a Server-Timing response header.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="other")
+_timings = contextvars.ContextVar("metrics_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        """Sum over all label combinations"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts, then sum, then count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        names = self.labelnames + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (repr(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {series[-1]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+# Callables returning [(name, type, help, [(labels_dict, value), ...]), ...] at scrape time
+COLLECTORS: List[Callable[[], list]] = []
+
+REQUESTS = Counter("rag_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+REQUEST_LATENCY = Histogram("rag_request_duration_seconds", "HTTP request latency", ("endpoint",))
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Requests currently being served", ("endpoint",))
+STAGE_LATENCY = Histogram("rag_stage_duration_seconds", "Latency of each pipeline stage",
+                          ("endpoint", "stage"))
+LLM_CALLS = Counter("rag_llm_requests_total", "LLM generations by endpoint and outcome",
+                    ("endpoint", "outcome"))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens sent and received (tiktoken estimate)",
+                     ("endpoint", "direction"))
+LLM_ERRORS = Counter("rag_llm_errors_total", "LLM errors by exception type", ("endpoint", "error"))
+LLM_RETRIES = Counter("rag_llm_retries_total", "LLM calls retried after a throttling or server error", ("status",))
+LLM_QUEUE_WAIT = Histogram("rag_llm_queue_wait_seconds", "Time LLM calls waited for their turn and rate budget",
+                           ("priority",))
+LLM_CALLS_SAVED = Counter("rag_llm_calls_saved_total",
+                          "LLM generations avoided by joining an identical in-flight request", ("endpoint",))
+
+
+def register_collector(collector: Callable[[], list]):
+    COLLECTORS.append(collector)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        for name, type_name, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, endpoint=_endpoint.get(), stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def request_timings() -> Dict[str, float]:
+    """Stage durations (seconds) recorded so far for the current request"""
+    return dict(_timings.get() or {})
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight gauges"""
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _endpoint_for(self, scope) -> str:
+        if self._paths is None:
+            router = scope.get("app")
+            routes = getattr(router, "routes", [])
+            self._paths = {getattr(route, "path", None) for route in routes}
+        path = scope.get("path", "")
+        return path if path in self._paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint_for(scope)
+        timings = {}
+        endpoint_token = _endpoint.set(endpoint)
+        timings_token = _timings.set(timings)
+        want_header = METRICS_TIMING_HEADER or any(
+            name == b"x-debug-timing" for name, _ in scope.get("headers", [])
+        )
+        status = {"code": 500}
+        start = time.perf_counter()
+        IN_FLIGHT.inc(endpoint=endpoint)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if want_header and timings:
+                    value = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec(endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=status["code"])
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            _endpoint.reset(endpoint_token)
+            _timings.reset(timings_token)
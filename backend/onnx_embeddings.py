@@ -0,0 +1,191 @@
+"""
+int8-quantized ONNX Runtime backend for the MiniLM embedder.
+
+Runs an exported, dynamically quantized copy of all-MiniLM-L6-v2 with
+onnxruntime and the Rust tokenizers library, so serving never imports
+torch or sentence-transformers: startup is faster, RSS is hundreds of MB
+lower, and per-query latency drops on CPU-only instances. Pooling matches
+sentence-transformers (mean over the attention mask, then L2-normalized),
+so vectors stay compatible with an index built by the PyTorch model.
+
+Select it with EMBEDDING_BACKEND=onnx. The model files are produced once
+(this step needs torch, transformers and onnx):
+
+    python onnx_embeddings.py --export        # writes ONNX_MODEL_DIR
+    python onnx_embeddings.py --verify        # cosine vs PyTorch on a test set
+"""
+
+import os
+import time
+from typing import List
+
+import numpy as np
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_model")
+# Intra-op threads per session (0 = onnxruntime default, one per core)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+# Texts per forward pass; small batches are faster on onnxruntime's CPU
+# kernels and keep its memory arena small (64 x 256 tokens grows it past 1 GB)
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "8"))
+ONNX_MODEL_FILE = "model_int8.onnx"
+ONNX_FP32_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# all-MiniLM-L6-v2's max_seq_length in sentence-transformers
+MAX_SEQ_LENGTH = 256
+MIN_COSINE = 0.99
+
+
+def check_model_files(model_dir: str = ONNX_MODEL_DIR, model_file: str = ONNX_MODEL_FILE):
+    """Raise FileNotFoundError, naming the export command, if the exported model is missing"""
+    missing = [name for name in (model_file, TOKENIZER_FILE) if not os.path.exists(os.path.join(model_dir, name))]
+    if missing:
+        raise FileNotFoundError(
+            f"EMBEDDING_BACKEND=onnx but {', '.join(missing)} not found in {model_dir}; "
+            f"run `python onnx_embeddings.py --export` (or set ONNX_MODEL_DIR)"
+        )
+
+
+class OnnxEmbeddings:
+    """LangChain-compatible embeddings running the quantized model on onnxruntime"""
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, batch_size: int = ONNX_BATCH_SIZE,
+                 threads: int = ONNX_THREADS, model_file: str = ONNX_MODEL_FILE):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        check_model_files(model_dir, model_file)
+        model_path = os.path.join(model_dir, model_file)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    @property
+    def client(self):
+        # EmbeddingPipeline drives the SentenceTransformer-style encode() below
+        return self
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled
+
+    def encode(self, sentences: List[str], batch_size: int = None, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False) -> np.ndarray:
+        """SentenceTransformer.encode equivalent: vectors in input order"""
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+        # Longest first so every batch holds similar lengths
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]), reverse=True)
+        vectors = np.concatenate([
+            self._encode_batch([sentences[i] for i in order[start:start + batch_size]])
+            for start in range(0, len(order), batch_size)
+        ])
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        if normalize_embeddings:
+            result /= np.clip(np.linalg.norm(result, axis=1, keepdims=True), 1e-12, None)
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def export_model(model_name: str, output_dir: str = ONNX_MODEL_DIR):
+    """Export the Hugging Face model to ONNX and quantize its weights to int8"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    model = AutoModel.from_pretrained(repo).eval()
+    tokenizer.save_pretrained(output_dir)  # writes tokenizer.json
+
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, ONNX_FP32_FILE)
+    dynamic = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "token_type_ids": dynamic,
+                          "last_hidden_state": dynamic},
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    print(f"✅ Exported {repo} to {output_dir} ({ONNX_FP32_FILE}, {ONNX_MODEL_FILE}, {TOKENIZER_FILE})")
+
+
+def verification_texts() -> List[str]:
+    """Chunks of the sample docs plus short questions about each of them"""
+    from ingest_docs import SAMPLE_DOCS
+
+    texts = []
+    for doc in SAMPLE_DOCS:
+        texts += [f"What is {doc['title']}?", f"When should I use {doc['service']}?"]
+        content = doc["content"]
+        texts += [content[start:start + 1000] for start in range(0, len(content), 800)]
+    return texts
+
+
+def verify(model_name: str, model_dir: str = ONNX_MODEL_DIR, min_cosine: float = MIN_COSINE) -> bool:
+    """Compare the quantized vectors with the PyTorch model's; True if all reach min_cosine"""
+    from sentence_transformers import SentenceTransformer
+
+    texts = verification_texts()
+    reference = SentenceTransformer(model_name, device="cpu").encode(
+        texts, normalize_embeddings=True, show_progress_bar=False)
+    start = time.perf_counter()
+    quantized = OnnxEmbeddings(model_dir).encode(texts)
+    elapsed = time.perf_counter() - start
+
+    cosines = (reference * quantized).sum(axis=1)
+    ok = bool(cosines.min() >= min_cosine)
+    print(f"{'✅' if ok else '❌'} {len(texts)} texts: cosine min {cosines.min():.4f}, "
+          f"mean {cosines.mean():.4f} (threshold {min_cosine}); ONNX encoded them in {elapsed:.2f}s")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from embedding import EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description="Export or verify the quantized ONNX embedding model")
+    parser.add_argument("--export", action="store_true", help="export and quantize the model")
+    parser.add_argument("--verify", action="store_true", help="check cosine similarity against PyTorch")
+    parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    args = parser.parse_args()
+    if not (args.export or args.verify):
+        parser.error("pass --export and/or --verify")
+
+    if args.export:
+        export_model(EMBEDDING_MODEL, args.model_dir)
+    if args.verify and not verify(EMBEDDING_MODEL, args.model_dir, args.min_cosine):
+        sys.exit(1)
@@ -0,0 +1,227 @@
+"""
+Precomputed quiz question pool with background refill.
+
+Questions are generated ahead of time in batches, validated, and stored
+in SQLite keyed by (topic, difficulty). /quiz samples from the pool, least
+served first, and each question is retired after QUIZ_BANK_MAX_SERVES
+uses. When a key's pool drops below the low-water mark, a background
+worker generates another batch, so LLM calls are amortized across many
+quizzes instead of paid on every request. Only the /topics topics at the
+standard difficulties are banked; any other topic or difficulty string is
+generated on demand, so the number of pools (and the LLM calls spent on
+refills) stays bounded.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from quiz_parser import validate_question
+
+QUIZ_BANK_ENABLED = os.getenv("QUIZ_BANK_ENABLED", "true").lower() == "true"
+QUIZ_BANK_PATH = os.getenv("QUIZ_BANK_PATH", "./quiz_bank.sqlite3")
+QUIZ_BANK_LOW_WATER = int(os.getenv("QUIZ_BANK_LOW_WATER", "20"))
+QUIZ_BANK_BATCH_SIZE = int(os.getenv("QUIZ_BANK_BATCH_SIZE", "10"))
+QUIZ_BANK_MAX_SERVES = int(os.getenv("QUIZ_BANK_MAX_SERVES", "3"))
+# How long /stats and /metrics reuse the bank's question counts
+QUIZ_BANK_STATS_TTL = float(os.getenv("QUIZ_BANK_STATS_TTL", "10"))
+# Difficulties filled for every /topics entry at startup (opt-in: empty disables
+# prefill, which would otherwise spend the LLM quota right after every deploy)
+QUIZ_BANK_PREFILL_DIFFICULTIES = [
+    d.strip() for d in os.getenv("QUIZ_BANK_PREFILL_DIFFICULTIES", "").split(",") if d.strip()
+]
+
+# Difficulties that get a pool; /quiz accepts free text, which is generated on demand
+QUIZ_BANK_DIFFICULTIES = ("easy", "medium", "hard")
+
+# Batches attempted per refill before giving up (e.g. the model keeps repeating itself)
+MAX_REFILL_ATTEMPTS = 3
+
+
+def bank_key(topic: str, difficulty: str) -> Tuple[str, str]:
+    return topic.strip().lower(), difficulty.strip().lower()
+
+
+# Lock files held for the life of the process
+_held_locks = []
+
+
+def acquire_prefill_lock(path: str = QUIZ_BANK_PATH) -> bool:
+    """Let one process per host prefill the bank (the first of several server workers)"""
+    handle = open(f"{path}.lock", "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _held_locks.append(handle)
+    return True
+
+
+class QuizBank:
+    """SQLite-backed question pool"""
+
+    def __init__(self, path: str = QUIZ_BANK_PATH, low_water: int = QUIZ_BANK_LOW_WATER,
+                 max_serves: int = QUIZ_BANK_MAX_SERVES):
+        self.path = path
+        self.low_water = low_water
+        self.max_serves = max_serves
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id INTEGER PRIMARY KEY, topic TEXT NOT NULL, difficulty TEXT NOT NULL, "
+            "question_hash TEXT NOT NULL UNIQUE, payload TEXT NOT NULL, "
+            "served INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS questions_pool ON questions(topic, difficulty, served)")
+        self._db.commit()
+        self.served_from_bank = 0
+        self.bank_misses = 0
+        self._counts = None
+        self._counted_at = 0.0
+
+    def available(self, topic: str, difficulty: str) -> int:
+        topic, difficulty = bank_key(topic, difficulty)
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM questions WHERE topic = ? AND difficulty = ? AND served < ?",
+                (topic, difficulty, self.max_serves)
+            ).fetchone()[0]
+
+    def needs_refill(self, topic: str, difficulty: str) -> bool:
+        return self.available(topic, difficulty) < self.low_water
+
+    def take(self, topic: str, difficulty: str, count: int) -> List[dict]:
+        """Sample `count` distinct questions, least served first; [] if the pool is too small"""
+        topic, difficulty = bank_key(topic, difficulty)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload FROM questions WHERE topic = ? AND difficulty = ? AND served < ? "
+                "ORDER BY served, RANDOM() LIMIT ?",
+                (topic, difficulty, self.max_serves, count)
+            ).fetchall()
+            if len(rows) < count:
+                self.bank_misses += 1
+                return []
+            self._db.executemany("UPDATE questions SET served = served + 1 WHERE id = ?",
+                                 [(row_id,) for row_id, _ in rows])
+            self._db.commit()
+            self.served_from_bank += 1
+        return [json.loads(payload) for _, payload in rows]
+
+    def add(self, topic: str, difficulty: str, questions: Iterable[dict], served: int = 0) -> int:
+        """Store validated questions, skipping duplicates; returns how many were new"""
+        topic, difficulty = bank_key(topic, difficulty)
+        rows = []
+        for item in questions:
+            question = validate_question(item)
+            if question is None:
+                continue
+            digest = hashlib.sha256(f"{topic}\0{difficulty}\0{question['question'].lower()}".encode()).hexdigest()
+            rows.append((topic, difficulty, digest, json.dumps(question), served, time.time()))
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO questions (topic, difficulty, question_hash, payload, served, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def stats(self) -> dict:
+        # Other workers share the file, so the totals are re-counted, at most every QUIZ_BANK_STATS_TTL
+        now = time.monotonic()
+        with self._lock:
+            if self._counts is None or now - self._counted_at >= QUIZ_BANK_STATS_TTL:
+                self._counts = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(served < ?), 0) FROM questions", (self.max_serves,)
+                ).fetchone()
+                self._counted_at = now
+            total, available = self._counts
+        return {
+            "questions": total,
+            "available": available,
+            "served_from_bank": self.served_from_bank,
+            "bank_misses": self.bank_misses,
+        }
+
+
+class QuizBankRefiller:
+    """Background task that tops up (topic, difficulty) pools one batch at a time"""
+
+    def __init__(self, bank: QuizBank,
+                 generate: Callable[[str, str, int], Awaitable[List[dict]]],
+                 batch_size: int = QUIZ_BANK_BATCH_SIZE, topics: Optional[Iterable[str]] = None,
+                 difficulties: Iterable[str] = QUIZ_BANK_DIFFICULTIES):
+        self.bank = bank
+        self.generate = generate
+        self.batch_size = batch_size
+        # Topics that may be refilled (None = any)
+        self.topics = None if topics is None else {bank_key(topic, "")[0] for topic in topics}
+        self.difficulties = {bank_key("", difficulty)[1] for difficulty in difficulties}
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending = set()
+        self._task = None
+        self.batches = 0
+        self.failures = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def covers(self, topic: str, difficulty: str) -> bool:
+        """Whether (topic, difficulty) has a pool at all"""
+        topic, difficulty = bank_key(topic, difficulty)
+        return (self.topics is None or topic in self.topics) and difficulty in self.difficulties
+
+    def request(self, topic: str, difficulty: str):
+        """Schedule a refill for a pool (no-op if one is already queued or the pool is not banked)"""
+        key = bank_key(topic, difficulty)
+        if self._queue is None or key in self._pending or not self.covers(topic, difficulty):
+            return
+        self._pending.add(key)
+        # Keep the caller's spelling for the prompt
+        self._queue.put_nowait((key, topic.strip(), difficulty.strip()))
+
+    async def _run(self):
+        while True:
+            key, topic, difficulty = await self._queue.get()
+            try:
+                for _ in range(MAX_REFILL_ATTEMPTS):
+                    if not self.bank.needs_refill(topic, difficulty):
+                        break
+                    questions = await self.generate(topic, difficulty, self.batch_size)
+                    self.batches += 1
+                    if self.bank.add(topic, difficulty, questions) == 0:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠️  Quiz bank refill failed for {topic} ({difficulty}): {e}")
+            finally:
+                self._pending.discard(key)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "batches_generated": self.batches,
+            "failures": self.failures,
+        }
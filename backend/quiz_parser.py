@@ -0,0 +1,132 @@
+"""
+Incremental parsing and validation of LLM quiz output.
+
+The model is asked for a JSON array of question objects, but it may wrap
+the array in prose or code fences, add stray brackets, or get one item
+wrong. Instead of matching the whole array, QuizStreamParser scans the
+text as it streams in and emits each top-level {...} object as soon as it
+closes. Objects that are not valid JSON or do not match QuizQuestion are
+dropped individually, so one bad item no longer costs the whole call.
+"""
+
+import json
+import os
+from typing import Iterable, List, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+# LLM calls per quiz: the first request plus re-requests for the missing questions
+QUIZ_MAX_ATTEMPTS = int(os.getenv("QUIZ_MAX_ATTEMPTS", "3"))
+
+
+class QuizQuestion(BaseModel):
+    question: str
+    options: List[str]
+    correct_answer: str
+    explanation: str = ""
+
+    @field_validator("question")
+    @classmethod
+    def _question_not_empty(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("empty question")
+        return value
+
+    @field_validator("options")
+    @classmethod
+    def _four_options(cls, value: List[str]) -> List[str]:
+        if len(value) != 4 or not all(option.strip() for option in value):
+            raise ValueError("expected four non-empty options")
+        return value
+
+    @field_validator("correct_answer")
+    @classmethod
+    def _answer_letter(cls, value: str) -> str:
+        # Accept "B", "b" and "B) Option 2"
+        letter = value.strip().upper()[:1]
+        if letter not in ("A", "B", "C", "D"):
+            raise ValueError(f"correct_answer must be A-D, got {value!r}")
+        return letter
+
+    @field_validator("explanation")
+    @classmethod
+    def _strip_explanation(cls, value: str) -> str:
+        return value.strip()
+
+
+def validate_question(item) -> Optional[dict]:
+    """Return a cleaned question dict if it matches QuizQuestion, else None"""
+    if not isinstance(item, dict):
+        return None
+    try:
+        return QuizQuestion(**item).model_dump()
+    except (ValidationError, TypeError):
+        return None
+
+
+class QuizStreamParser:
+    """Feed text chunks; get back each valid question object as soon as it is complete"""
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.invalid = 0
+
+    def feed(self, text: str) -> List[dict]:
+        questions = []
+        for char in text:
+            if self._depth == 0:
+                # Between objects: skip the array brackets, commas and any prose
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    question = self._finish("".join(self._buffer))
+                    if question is not None:
+                        questions.append(question)
+        return questions
+
+    def _finish(self, raw: str) -> Optional[dict]:
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            item = None
+        question = validate_question(item)
+        if question is None:
+            self.invalid += 1
+        return question
+
+
+def parse_questions(text: str) -> List[dict]:
+    """All valid question objects in a complete model response"""
+    return QuizStreamParser().feed(text)
+
+
+def unique_questions(questions: Iterable[dict], seen: set) -> List[dict]:
+    """Drop questions whose text is already in `seen` (which is updated)"""
+    fresh = []
+    for question in questions:
+        key = question["question"].lower()
+        if key not in seen:
+            seen.add(key)
+            fresh.append(question)
+    return fresh
@@ -0,0 +1,57 @@
+"""
+Local cross-encoder reranking of retrieved chunks.
+
+Retrieval over-fetches candidates, then a small CPU cross-encoder scores
+every (question, chunk) pair in a single batched forward pass. The pass
+runs on the "rerank" stage pool with the latency budget as its timeout;
+if the budget is exceeded, or every rerank worker is still busy (a pass
+that ran over its budget keeps its thread until it finishes), the
+original retrieval order is used instead.
+"""
+
+import os
+import time
+from typing import List
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+
+
+class Reranker:
+    """Batched cross-encoder scorer with latency and fallback counters"""
+
+    def __init__(self, model_name: str = RERANK_MODEL):
+        from sentence_transformers import CrossEncoder
+
+        print(f"🔧 Loading reranker {model_name}...")
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu", max_length=512)
+        print("✅ Reranker loaded!")
+        self.reranked = 0
+        self.fallbacks = 0
+        self.busy_fallbacks = 0
+        self.last_latency_ms = 0.0
+
+    def score(self, question: str, docs) -> List[float]:
+        """Relevance scores for each document, from one forward pass"""
+        start = time.perf_counter()
+        pairs = [(question, doc.page_content) for doc in docs]
+        scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        self.last_latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        return [float(s) for s in scores]
+
+    @staticmethod
+    def order(docs, scores: List[float], top_k: int):
+        ranked = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)
+        return [doc for doc, _ in ranked[:top_k]]
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "reranked": self.reranked,
+            "budget_fallbacks": self.fallbacks,
+            "busy_fallbacks": self.busy_fallbacks,
+            "last_latency_ms": self.last_latency_ms,
+        }
@@ -0,0 +1,308 @@
+"""
+Server-side chat sessions.
+
+Instead of resending the whole conversation_history with every /chat POST,
+a client can create a session and send only session_id plus the new
+question; the backend appends each exchange to the session. Sessions
+expire after SESSION_TTL seconds of inactivity, and the least recently
+used ones are evicted once the stored turn text exceeds SESSION_MAX_BYTES.
+
+SESSION_BACKEND selects the store: "memory" (in-process dict, lost on
+restart), "sqlite" (survives restarts, SESSION_DB_PATH) or "off".
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from conversation import Turn
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+# Older turns are dropped beyond this (the conversation summary covers them)
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "200"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite3")
+# How long /stats reuses the SQLite store's session count and size
+SESSION_STATS_TTL = float(os.getenv("SESSION_STATS_TTL", "10"))
+
+
+def turn_bytes(turn: Turn) -> int:
+    return len(turn.content.encode("utf-8")) + 1
+
+
+class SessionStore:
+    """Base class: create/get/append/delete sessions of Turns"""
+
+    name = "base"
+
+    def __init__(self, ttl: float = SESSION_TTL, max_bytes: int = SESSION_MAX_BYTES,
+                 max_turns: int = SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(16)
+
+    def create(self) -> str:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[List[Turn]]:
+        """The session's turns, or None if it does not exist or has expired"""
+        raise NotImplementedError
+
+    def append(self, session_id: str, turns: Iterable[Turn]) -> bool:
+        """Add turns to a live session; False if it no longer exists"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class _Session:
+    __slots__ = ("turns", "bytes", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.turns: List[Turn] = []
+        self.bytes = 0
+        self.expires_at = expires_at
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store: O(1) lookup, LRU order kept by an OrderedDict"""
+
+    name = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+
+    def _live(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.expires_at <= time.time():
+            self._drop(session_id)
+            self.expired += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        session.expires_at = time.time() + self.ttl
+        return session
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.bytes
+
+    def _enforce_limits(self, keep: str):
+        # LRU order is also expiry order, so expired sessions are at the front
+        now = time.time()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.expires_at > now or session_id == keep:
+                break
+            self._drop(session_id)
+            self.expired += 1
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id)
+            self.evicted += 1
+
+    def create(self) -> str:
+        session_id = self.new_id()
+        with self._lock:
+            self._sessions[session_id] = _Session(time.time() + self.ttl)
+            self._enforce_limits(keep=session_id)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[List[Turn]]:
+        with self._lock:
+            session = self._live(session_id)
+            return list(session.turns) if session is not None else None
+
+    def append(self, session_id: str, turns: Iterable[Turn]) -> bool:
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return False
+            for turn in turns:
+                session.turns.append(turn)
+                size = turn_bytes(turn)
+                session.bytes += size
+                self._bytes += size
+            while len(session.turns) > self.max_turns:
+                size = turn_bytes(session.turns.pop(0))
+                session.bytes -= size
+                self._bytes -= size
+            self._enforce_limits(keep=session_id)
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "sessions": len(self._sessions),
+                "turn_bytes": self._bytes,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Durable store: sessions survive restarts and can be shared by workers on one host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # A crash may lose the last exchange; no fsync on every /chat
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, expires_at REAL NOT NULL, last_used REAL NOT NULL, "
+            "bytes INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE, "
+            "seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions(last_used)")
+        self._db.commit()
+        self._counts = None
+        self._counted_at = 0.0
+
+    def _touch(self, session_id: str) -> bool:
+        now = time.time()
+        row = self._db.execute("SELECT expires_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return False
+        if row[0] <= now:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+            self.expired += 1
+            return False
+        self._db.execute("UPDATE sessions SET expires_at = ?, last_used = ? WHERE id = ?",
+                         (now + self.ttl, now, session_id))
+        return True
+
+    def create(self) -> str:
+        session_id = self.new_id()
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO sessions (id, expires_at, last_used) VALUES (?, ?, ?)",
+                             (session_id, now + self.ttl, now))
+            self._db.commit()
+        return session_id
+
+    def get(self, session_id: str) -> Optional[List[Turn]]:
+        with self._lock:
+            if not self._touch(session_id):
+                return None
+            rows = self._db.execute("SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq",
+                                    (session_id,)).fetchall()
+            self._db.commit()
+        return [Turn(role, content) for role, content in rows]
+
+    def append(self, session_id: str, turns: Iterable[Turn]) -> bool:
+        turns = list(turns)
+        with self._lock:
+            if not self._touch(session_id):
+                return False
+            (last_seq,) = self._db.execute("SELECT COALESCE(MAX(seq), -1) FROM turns WHERE session_id = ?",
+                                           (session_id,)).fetchone()
+            self._db.executemany(
+                "INSERT INTO turns (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, last_seq + 1 + i, turn.role, turn.content) for i, turn in enumerate(turns)]
+            )
+            self._db.execute(
+                "DELETE FROM turns WHERE session_id = ? AND seq <= ?",
+                (session_id, last_seq + len(turns) - self.max_turns)
+            )
+            self._db.execute(
+                "UPDATE sessions SET bytes = (SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB)) + 1), 0) "
+                "FROM turns WHERE session_id = ?) WHERE id = ?", (session_id, session_id)
+            )
+            self._enforce_limits(keep=session_id)
+            self._db.commit()
+        return True
+
+    def _enforce_limits(self, keep: str):
+        cursor = self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        self.expired += cursor.rowcount
+        (total,) = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+        if total <= self.max_bytes:
+            return
+        for session_id, size in self._db.execute(
+                "SELECT id, bytes FROM sessions WHERE id != ? ORDER BY last_used", (keep,)).fetchall():
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.evicted += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+            return cursor.rowcount > 0
+
+    def stats(self) -> dict:
+        # Other workers write the same file, so the totals are re-counted, at most every SESSION_STATS_TTL
+        now = time.monotonic()
+        with self._lock:
+            if self._counts is None or now - self._counted_at >= SESSION_STATS_TTL:
+                self._counts = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+                self._counted_at = now
+            sessions, total = self._counts
+        return {
+            "backend": self.name,
+            "sessions": sessions,
+            "turn_bytes": total,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+SESSION_BACKENDS = {
+    "memory": MemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+}
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> Optional[SessionStore]:
+    """Instantiate the store selected by name (SESSION_BACKEND by default); None when off"""
+    if backend == "off":
+        return None
+    try:
+        store_class = SESSION_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown SESSION_BACKEND '{backend}' (choose from off, {', '.join(SESSION_BACKENDS)})")
+    return store_class()
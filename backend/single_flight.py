@@ -0,0 +1,124 @@
+"""
+Single-flight coalescing of identical in-flight requests
+
+When a class works through the same module, many students send the same
+question within seconds. Instead of each request running its own retrieval
+and LLM call, the first request for a key (the leader) starts the work in a
+background task and every identical request that arrives while it is still
+running (a follower) waits for that same result.
+
+SingleFlight.do() shares a single result; SingleFlight.stream() shares an
+async iterator: its items are buffered, so a follower that joins mid-stream
+first replays what it missed and then follows live. The shared work runs in
+its own task, so a leader whose client disconnects does not cancel it for
+the followers. Keys are removed as soon as the work finishes: this is not a
+cache, later requests start a new flight.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Tuple
+
+
+class _Broadcast:
+    """Items produced by one shared stream, replayable by any number of subscribers"""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, item):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator:
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share it with concurrent callers"""
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Await func() once per in-flight key; returns (result, shared)
+
+        shared is True for followers, which got the leader's result without
+        running func themselves.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: a caller that is cancelled stops waiting without cancelling the others
+        return await asyncio.shield(task), shared
+
+    def stream(self, key: Hashable, func: Callable[[], AsyncIterator]) -> Tuple[AsyncIterator, bool]:
+        """Subscribe to the in-flight stream for key, starting func() if there is none
+
+        Returns (items, shared); items replays everything the stream has
+        produced so far and then follows it to the end (or its error).
+        """
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            task = asyncio.ensure_future(self._pump(func, broadcast))
+            task.add_done_callback(lambda _: self._streams.pop(key, None))
+        return broadcast.subscribe(), shared
+
+    async def _pump(self, func: Callable[[], AsyncIterator], broadcast: _Broadcast):
+        error = None
+        try:
+            async for item in func():
+                broadcast.push(item)
+        except Exception as e:
+            error = e
+        except BaseException:
+            # Cancelled (e.g. shutdown): subscribers get an error instead of waiting forever
+            error = RuntimeError("shared request was cancelled")
+            raise
+        finally:
+            broadcast.finish(error)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_rate": round(self.followers / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,126 @@
+"""
+BM25 keyword index over the ingested chunks, plus reciprocal rank fusion.
+
+MiniLM embeddings blur exact identifiers such as "MLS-C01" or "A2I"; a
+sparse index matches them verbatim. The index is built at ingest time,
+saved next to the Chroma files and loaded once at startup. Lookups walk
+only the postings of the query terms, so they stay in the low milliseconds.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+SPARSE_INDEX_FILENAME = "bm25_index.json"
+HYBRID_SPARSE_WEIGHT = float(os.getenv("HYBRID_SPARSE_WEIGHT", "0.5"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens; hyphenated identifiers are kept whole and
+    also split into their parts ("mls-c01" -> "mls-c01", "mls", "c01").
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token or "_" in token:
+            tokens.extend(part for part in re.split(r"[-_]", token) if part)
+    return tokens
+
+
+def document_key(doc) -> Tuple[str, str]:
+    """Identity of a chunk across the dense and sparse retrievers"""
+    return doc.metadata.get("source", ""), doc.page_content
+
+
+class SparseIndex:
+    """In-memory BM25 (Okapi) inverted index"""
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_id, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if documents else 0.0
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query: str, k: int = HYBRID_CANDIDATES) -> List[Tuple[Document, float]]:
+        """Top-k documents by BM25 score"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[doc_id], score) for doc_id, score in ranked]
+
+    def save(self, persist_directory: str):
+        """Write the chunks to disk; postings are rebuilt on load"""
+        path = os.path.join(persist_directory, SPARSE_INDEX_FILENAME)
+        payload = [{"text": doc.page_content, "metadata": doc.metadata} for doc in self.documents]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"documents": payload}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, persist_directory: str) -> Optional["SparseIndex"]:
+        path = os.path.join(persist_directory, SPARSE_INDEX_FILENAME)
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls([Document(page_content=d["text"], metadata=d["metadata"]) for d in payload["documents"]])
+
+    @classmethod
+    def from_collection(cls, collection) -> "SparseIndex":
+        """Build over every chunk currently in a Chroma collection"""
+        data = collection.get(include=["documents", "metadatas"])
+        return cls([
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(data["documents"], data["metadatas"])
+        ])
+
+
+def reciprocal_rank_fusion(dense: List[Document], sparse: List[Document], k: int,
+                           sparse_weight: float = HYBRID_SPARSE_WEIGHT) -> List[Document]:
+    """Fuse two ranked lists: score = sum(weight / (RRF_K + rank))"""
+    scores: Dict[Tuple[str, str], float] = {}
+    by_key: Dict[Tuple[str, str], Document] = {}
+    for weight, ranking in ((1.0 - sparse_weight, dense), (sparse_weight, sparse)):
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            by_key.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (RRF_K + rank)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)[:k]
+    return [by_key[key] for key in ranked]
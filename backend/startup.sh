@@ -3,8 +3,8 @@ set -e
 
 echo "🚀 Starting AWS AI Learning Platform Backend..."
 
-# Check if GOOGLE_API_KEY is set
-if [ -z "$GOOGLE_API_KEY" ]; then
+# Check if GOOGLE_API_KEY is set (not needed for the local stub LLM)
+if [ "${LLM_PROVIDER:-gemini}" = "gemini" ] && [ -z "$GOOGLE_API_KEY" ]; then
     echo "❌ ERROR: GOOGLE_API_KEY environment variable is not set!"
     echo "Please set it in your Railway environment variables."
     exit 1
@@ -20,5 +20,10 @@ else
 fi
 
 # Start the server
-echo "🌐 Starting FastAPI server on port ${PORT:-8000}..."
+# WEB_CONCURRENCY > 1 runs gunicorn with uvicorn workers sharing one preloaded model
+WORKERS=${WEB_CONCURRENCY:-1}
+echo "🌐 Starting FastAPI server on port ${PORT:-8000} with ${WORKERS} worker(s)..."
+if [ "$WORKERS" -gt 1 ]; then
+    exec gunicorn -c gunicorn.conf.py main:app
+fi
 exec uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} --workers 1